@@ -0,0 +1,328 @@
+"""Time the plotting pipeline on synthetic wrfout files and compare against a stored baseline.
+
+Each product (Max_Dbz, Temperature, Acc_Precip) renders every frame in one process under
+the render script's FrameProfiler, so each frame's wall time is split into the same stages
+as with --profile_dir (open, getvar, resample, figure, ..., savefig, other); its per-frame
+CSV/JSON end up in <work_dir>/<grid>/profile/<product>.
+With --update_baseline the timings are stored and with --update_signatures a coarse
+signature of every image; later runs report frames that got slower than the tolerance or
+whose images changed.
+
+    python benchmarks/bench_render.py --grids 150x120,400x320 --frames 6 -- --render template --resample pixel
+
+--compare_resample renders every product with --resample zoom and with --resample pixel
+and fails when more than --changed_tolerance of the pixels differ (default 2%) or more
+than --far_tolerance (0.2%) are over one colour bin apart, i.e. not just on a bin edge.
+
+The benchmark runs offline: unless --feature_cache is passed to the render script, the
+region-clipped coastlines committed in feature_cache/ are copied into the work directory
+and used from there. The image signatures (signatures.json) are committed;
+timings depend on the machine, so keep one baseline file per machine.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args as plots
+from make_wrfout import generate
+
+STAGES = plots.FrameProfiler.STAGES
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_SIGNATURES = os.path.join(BENCH_DIR, "signatures.json")
+FEATURE_CACHE = os.path.join(os.path.dirname(BENCH_DIR), "feature_cache")
+
+
+def image_signature(path, size=24):
+    """Image downsampled to size x size RGB, as hex: stable across runs, sensitive to visible changes."""
+    with Image.open(path) as image:
+        small = image.convert("RGB").resize((size, size), Image.BOX)
+    return small.tobytes().hex()
+
+
+def signature_levels(signature):
+    return np.frombuffer(bytes.fromhex(signature), dtype=np.uint8).astype(np.int16)
+
+
+def with_feature_cache(render_args, work_dir):
+    """render_args using a copy of the committed feature cache, unless they name one.
+
+    Projected coastlines are written next to the clipped ones on first use, so the copy
+    keeps them out of the source tree.
+    """
+    if "--feature_cache" in render_args:
+        return render_args
+    cache_dir = os.path.join(work_dir, "feature_cache")
+    shutil.copytree(FEATURE_CACHE, cache_dir, dirs_exist_ok=True)
+    return render_args + ["--feature_cache", cache_dir]
+
+
+def build_plotter(plot_type, render_args, data_dir):
+    args = plots.build_parser().parse_args(
+        ["--type", plot_type, "--data_dir", data_dir, "--weather_model", "bench", "--geometry_cache", ""]
+        + render_args)
+    return plots.build_plotter(plot_type, args, plots.GeometryCache(None),
+                               plots.FeatureCache(args.feature_cache) if args.feature_cache else None)
+
+
+def split_results(results):
+    frames = [(filepath, output) for filepath, output, error in results if error is None and output]
+    failed = [filepath for filepath, _, error in results if error is not None]
+    return frames, failed
+
+
+def run_product(plot_type, render_args, data_dir):
+    plotter = build_plotter(plot_type, render_args, data_dir)
+    plots._PROFILER = plots.FrameProfiler(os.path.join(data_dir, "profile", plot_type))
+    plots._PROFILER.start()
+    try:
+        started = time.perf_counter()
+        results = plotter.run_all(workers=1)
+        wall = time.perf_counter() - started
+    finally:
+        records = plots._PROFILER.report()
+        plots._PROFILER = None
+
+    frames, failed = split_results(results)
+    records = [record for record in records if "error" not in record]
+    count = max(1, len(records))
+    frame_time = sum(record["wall_ms"] for record in records) / 1000
+    return {
+        "frames": len(frames),
+        "failed": len(failed),
+        "wall_s": round(wall, 3),
+        "setup_s": round(wall - frame_time, 3),
+        "per_frame_ms": round(1000 * frame_time / count, 1),
+        "stages_ms": {stage: round(sum(record[f"{stage}_ms"] for record in records) / count, 1)
+                      for stage in STAGES},
+        "peak_rss_mb": max((record["peak_rss_mb"] for record in records), default=0),
+        "images": {os.path.basename(output): image_signature(output) for _, output in frames},
+    }
+
+
+def color_bins(rgb, colors, max_distance=3):
+    """Colour-table bin of every pixel, -1 where no table colour is within max_distance levels."""
+    table = colors.colors[:-1, :3].astype(np.int16)  # without the "bad" colour
+    distance = np.abs(rgb[..., None, :].astype(np.int16) - table).max(axis=-1)
+    bins = distance.argmin(axis=-1)
+    bins[distance.min(axis=-1) > max_distance] = -1
+    return bins
+
+
+def resample_difference(zoom_path, pixel_path, colors, level_tolerance=2):
+    """How the pixel-resampled image differs from the zoom one.
+
+    Returns (changed, far): the fraction of pixels that differ by more than level_tolerance
+    in any channel, and the fraction of pixels showing a field colour in both images whose
+    colour-table bins are more than one bin apart. Both paths interpolate the same grid
+    linearly (zoom draws each quarter cell flat), so they should only disagree next to a
+    bin edge, where a pixel lands in the neighbouring bin.
+    """
+    with Image.open(zoom_path) as image:
+        zoom = np.asarray(image.convert("RGB"))
+    with Image.open(pixel_path) as image:
+        pixel = np.asarray(image.convert("RGB"))
+    if zoom.shape != pixel.shape:
+        return 1.0, 1.0
+    changed = np.abs(zoom.astype(np.int16) - pixel).max(axis=-1) > level_tolerance
+    zoom_bins = color_bins(zoom[changed], colors)
+    pixel_bins = color_bins(pixel[changed], colors)
+    field = (zoom_bins >= 0) & (pixel_bins >= 0)
+    far = np.count_nonzero(field & (np.abs(zoom_bins - pixel_bins) > 1))
+    return changed.mean(), far / changed.size
+
+
+def compare_resample(plot_type, render_args, data_dir, changed_tolerance, far_tolerance):
+    """Render plot_type with --resample zoom and pixel; problems and (name, changed, far) per frame."""
+    rendered = {}
+    for resample in ("zoom", "pixel"):
+        plotter = build_plotter(plot_type, render_args + ["--resample", resample], data_dir)
+        frames, failed = split_results(plotter.run_all(workers=1))
+        if failed:
+            return [f"{plot_type} --resample {resample}: {len(failed)} frames failed"], []
+        rendered[resample] = {}
+        for _, output in frames:
+            # Both runs write the same file names, so keep the zoom images aside
+            kept = f"{output}.{resample}"
+            os.replace(output, kept)
+            rendered[resample][os.path.basename(output)] = kept
+
+    colors = plots.ColorTable(*plotter.get_colormap()[:2])
+    problems, rows = [], []
+    for name, zoom_path in sorted(rendered["zoom"].items()):
+        pixel_path = rendered["pixel"].get(name)
+        if pixel_path is None:
+            problems.append(f"{plot_type}: {name} was only rendered with --resample zoom")
+            continue
+        changed, far = resample_difference(zoom_path, pixel_path, colors)
+        rows.append((name, changed, far))
+        if changed > changed_tolerance:
+            problems.append(f"{plot_type}: {name} differs in {100 * changed:.2f}% of pixels "
+                            f"(allowed {100 * changed_tolerance:.2f}%)")
+        if far > far_tolerance:
+            problems.append(f"{plot_type}: {name} has {100 * far:.3f}% of pixels more than one colour bin apart "
+                            f"(allowed {100 * far_tolerance:.3f}%)")
+    return problems, rows
+
+
+def compare(key, result, baseline, signatures, tolerance, pixel_tolerance):
+    """Problems of result against its timing baseline and image signatures, as printable lines."""
+    problems = []
+    if result["failed"]:
+        problems.append(f"{key}: {result['failed']} frames failed")
+    if baseline is not None:
+        limit = baseline["per_frame_ms"] * (1 + tolerance)
+        if result["per_frame_ms"] > limit:
+            problems.append(f"{key}: {result['per_frame_ms']:.0f} ms per frame, "
+                            f"baseline {baseline['per_frame_ms']:.0f} ms "
+                            f"(+{100 * (result['per_frame_ms'] / baseline['per_frame_ms'] - 1):.0f}%)")
+    for name, signature in (signatures or {}).items():
+        current = result["images"].get(name)
+        if current is None:
+            problems.append(f"{key}: {name} was not rendered")
+            continue
+        difference = np.abs(signature_levels(current) - signature_levels(signature)).max()
+        if difference > pixel_tolerance:
+            problems.append(f"{key}: {name} differs from its signature (max {difference} levels)")
+    return problems
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def print_table(rows):
+    width = max([len("case")] + [len(key) for key, _ in rows])
+    header = f"{'case':<{width}} {'frames':>6} {'ms/frame':>9} " + " ".join(f"{stage:>9}" for stage in STAGES)
+    print(header)
+    print("-" * len(header))
+    for key, result in rows:
+        stages = " ".join(f"{result['stages_ms'][stage]:>9.0f}" for stage in STAGES)
+        print(f"{key:<{width}} {result['frames']:>6} {result['per_frame_ms']:>9.0f} {stages}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark Max_Dbz, Temperature and Acc_Precip on synthetic wrfout files",
+        usage="%(prog)s [options] [-- <render script options, e.g. --render template --resample pixel>]")
+    parser.add_argument("--grids", default="150x120", help="Comma-separated NXxNY grid sizes")
+    parser.add_argument("--frames", type=int, default=6, help="Hourly files per grid")
+    parser.add_argument("--nz", type=int, default=20, help="Vertical levels")
+    parser.add_argument("--products", default=",".join(plots.PLOT_TYPES), help="Comma-separated plot types")
+    parser.add_argument("--work_dir", default="/tmp/wrf_bench", help="Synthetic data and rendered images")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="Timing baseline JSON of this machine to compare with (and update)")
+    parser.add_argument("--update_baseline", action="store_true", help="Store this run's timings as the baseline")
+    parser.add_argument("--signatures", default=DEFAULT_SIGNATURES,
+                        help="Image signature JSON to compare with (and update)")
+    parser.add_argument("--update_signatures", action="store_true",
+                        help="Store this run's image signatures")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown per frame (0.25 = 25%%)")
+    parser.add_argument("--pixel_tolerance", type=int, default=8,
+                        help="Allowed difference of the downsampled images in 8-bit levels")
+    parser.add_argument("--output", default=None, help="Also write the results as JSON here")
+    parser.add_argument("--compare_resample", action="store_true",
+                        help="Instead of timing, render every product with --resample zoom and pixel and compare "
+                             "the images pixel by pixel")
+    parser.add_argument("--changed_tolerance", type=float, default=0.02,
+                        help="--compare_resample: allowed fraction of pixels that differ (0.02 = 2%%)")
+    parser.add_argument("--far_tolerance", type=float, default=0.002,
+                        help="--compare_resample: allowed fraction of pixels more than one colour bin apart "
+                             "(steep edges over the narrow 0.1/0.5/1 mm precipitation bins)")
+    parser.add_argument("render_args", nargs=argparse.REMAINDER, help="Options for the render script")
+    args = parser.parse_args()
+    render_args = args.render_args[1:] if args.render_args[:1] == ["--"] else args.render_args
+    # Cases are keyed by the options as given, so the work directory does not end up in the key
+    run_args = with_feature_cache(render_args, args.work_dir)
+
+    data_dirs = []
+    for grid in args.grids.split(","):
+        nx, ny = (int(n) for n in grid.lower().split("x"))
+        data_dir = os.path.join(args.work_dir, f"{nx}x{ny}x{args.nz}_{args.frames}")
+        if not os.path.isdir(data_dir):
+            print(f">> Generating {args.frames} frames of {nx}x{ny}x{args.nz} in {data_dir}")
+            generate(data_dir, nx=nx, ny=ny, nz=args.nz, frames=args.frames)
+        data_dirs.append((nx, ny, data_dir))
+
+    if args.compare_resample:
+        problems = []
+        for nx, ny, data_dir in data_dirs:
+            os.chdir(data_dir)
+            for plot_type in args.products.split(","):
+                print(f">> {nx}x{ny}/{plot_type}: --resample zoom vs pixel")
+                product_problems, frames = compare_resample(plot_type, run_args, data_dir,
+                                                            args.changed_tolerance, args.far_tolerance)
+                for name, changed, far in frames:
+                    print(f"   {name}: {100 * changed:.2f}% pixels differ, {100 * far:.3f}% more than one bin apart")
+                problems += product_problems
+        if problems:
+            print(f"\n⚠️ {len(problems)} differences between --resample zoom and pixel:")
+            for problem in problems:
+                print(f"   ❌ {problem}")
+            sys.exit(1)
+        print(f"\n✅ --resample pixel matches zoom within {100 * args.changed_tolerance:.2f}% of pixels, "
+              f"{100 * args.far_tolerance:.3f}% more than one colour bin apart")
+        sys.exit(0)
+
+    baselines = load_json(args.baseline)
+    signatures = load_json(args.signatures)
+
+    rows = []
+    for nx, ny, data_dir in data_dirs:
+        os.chdir(data_dir)
+        for plot_type in args.products.split(","):
+            key = f"{nx}x{ny}/{plot_type} {' '.join(render_args)}".strip()
+            print(f">> {key}")
+            rows.append((key, run_product(plot_type, run_args, data_dir)))
+
+    print()
+    print_table(rows)
+    problems = []
+    for key, result in rows:
+        problems += compare(key, result, baselines.get(key), signatures.get(key), args.tolerance, args.pixel_tolerance)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({key: result for key, result in rows}, f, indent=1)
+    if args.update_baseline:
+        for key, result in rows:
+            timings = {name: value for name, value in result.items() if name != "images"}
+            baselines[key] = dict(timings, host=platform.node(), recorded=time.strftime("%Y-%m-%d %H:%M"))
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=1)
+        print(f"\n✅ Baseline updated: {args.baseline}")
+    if args.update_signatures:
+        for key, result in rows:
+            signatures[key] = result["images"]
+        with open(args.signatures, "w") as f:
+            json.dump(signatures, f, indent=1)
+        print(f"\n✅ Signatures updated: {args.signatures}")
+    if args.update_baseline or args.update_signatures:
+        sys.exit(0)
+    if problems:
+        print(f"\n⚠️ {len(problems)} differences from {args.baseline} / {args.signatures}:")
+        for problem in problems:
+            print(f"   ❌ {problem}")
+        sys.exit(1)
+    else:
+        timed = [key for key, _ in rows if key in baselines]
+        signed = [key for key, _ in rows if key in signatures]
+        print(f"\n✅ {len(timed)} of {len(rows)} cases match the timing baseline, "
+              f"{len(signed)} of {len(rows)} the image signatures")
+        if len(timed) < len(rows) or len(signed) < len(rows):
+            print("   Store the others with --update_baseline / --update_signatures")
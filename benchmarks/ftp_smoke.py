@@ -0,0 +1,178 @@
+"""Smoke run of ftp_download.py against a local pyftpdlib server (pip install pyftpdlib).
+
+A temporary job directory with run.sh and a nested inputs/ tree is served on 127.0.0.1
+and downloaded three times, as consecutive jobs on one worker would:
+
+1. cold: every file comes from the server. The first RETR of run.sh, the first listing
+   and the first RETR of one input are refused with 450, so each retry path runs;
+2. warm: the run directory is wiped (as the cleaners do) and every input is linked
+   from the input cache;
+3. changed: one remote input is rewritten and only that file is fetched again.
+
+Exits non-zero when a run fails or a local file differs from the server's copy.
+
+    python benchmarks/ftp_smoke.py
+"""
+import os
+import re
+import sys
+import shutil
+import tempfile
+import logging
+import argparse
+import threading
+import subprocess
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.log import config_logging
+from pyftpdlib.servers import FTPServer
+
+DOWNLOADER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ftp_download.py")
+
+INPUTS = {
+    "wrfinput_d01": 300_000,
+    "wrfbdy_d01": 120_000,
+    "geo/geo_em.d01.nc": 200_000,
+    "geo/geo_em.d02.nc": 150_000,
+    "met/met_em.d01.2025-07-30_00:00:00.nc": 80_000,
+}
+
+
+class FlakyHandler(FTPHandler):
+    """Refuses each (command, file name) in `refuse` once with 450, like a busy server."""
+
+    refuse = set()
+
+    def _refused(self, command, path):
+        key = (command, os.path.basename(path.rstrip("/")))
+        if key in self.refuse:
+            self.refuse.discard(key)
+            self.respond("450 Temporarily unavailable.")
+            return True
+        return False
+
+    def ftp_RETR(self, file):
+        if not self._refused("RETR", file):
+            return super().ftp_RETR(file)
+
+    def ftp_MLSD(self, path):
+        if not self._refused("MLSD", path):
+            return super().ftp_MLSD(path)
+
+
+def make_job(root):
+    job = os.path.join(root, "job")
+    os.makedirs(job)
+    with open(os.path.join(job, "run.sh"), "w") as f:
+        f.write("#!/bin/bash\necho run\n")
+    for rel, size in INPUTS.items():
+        path = os.path.join(job, "inputs", rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+    return job
+
+
+def serve(root):
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("smoke", "smoke", root, perm="elr")
+    FlakyHandler.authorizer = authorizer
+    config_logging(level=logging.WARNING)
+    server = FTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, kwargs={"handle_exit": False}, daemon=True).start()
+    return server
+
+
+def download(port, work, label):
+    env = dict(os.environ, FTP_HOST=f"127.0.0.1:{port}", FTP_USER="smoke", FTP_PASS="smoke", FTP_DIR="job")
+    result = subprocess.run(
+        [sys.executable, DOWNLOADER, "--target_dir", os.path.join(work, "run"),
+         "--run_script", os.path.join(work, "run", "run.sh"), "--workers", "3", "--retries", "3",
+         "--listing_cache", os.path.join(work, "listing.json"), "--input_cache", os.path.join(work, "cache"),
+         "--fails_file", os.path.join(work, "fails.txt")],
+        env=env, capture_output=True, text=True)
+    print(f">> {label}: exit {result.returncode}")
+    return result
+
+
+def same_tree(job, work):
+    problems = []
+    for rel in ["run.sh"] + [f"inputs/{rel}" for rel in INPUTS]:
+        local = os.path.join(work, "run", rel)
+        try:
+            with open(os.path.join(job, rel), "rb") as remote_file, open(local, "rb") as local_file:
+                if remote_file.read() != local_file.read():
+                    problems.append(f"{rel} differs from the server's copy")
+        except OSError as e:
+            problems.append(f"{rel}: {e}")
+    if not os.access(os.path.join(work, "run", "run.sh"), os.X_OK):
+        problems.append("run.sh is not executable")
+    return problems
+
+
+def check(result, job, work, expect_linked=None, expect_changed=None, expect_retries=False):
+    problems = [] if result.returncode == 0 else [f"exit {result.returncode}: {result.stderr.strip()[-500:]}"]
+    problems += same_tree(job, work)
+    output = result.stdout
+    if os.path.exists(os.path.join(work, "fails.txt")):
+        problems.append("fails file written")
+    linked = re.search(r"Input cache: (\d+) files linked", output)
+    if expect_linked is not None and (linked is None or int(linked.group(1)) != expect_linked):
+        problems.append(f"expected {expect_linked} files from the input cache: {linked and linked.group(0)}")
+    changed = re.search(r">> (\d+) files changed on the server", output)
+    if expect_changed is not None and int(changed.group(1) if changed else 0) != expect_changed:
+        problems.append(f"expected {expect_changed} changed files: {changed and changed.group(0)}")
+    if expect_retries:
+        for what in ("run.sh", "the listing", "wrfbdy_d01"):
+            if not re.search(rf"Attempt 1/\d+ for \S*{re.escape(what)} failed", output):
+                problems.append(f"no retry of {what}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ftp_download.py against a local FTP server")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary directory")
+    parser.add_argument("--verbose", action="store_true", help="Print the downloader's output")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="ftp_smoke_")
+    server = None
+    problems = []
+    try:
+        served = os.path.join(root, "server")
+        work = os.path.join(root, "worker")
+        os.makedirs(served)
+        os.makedirs(work)
+        job = make_job(served)
+        server = serve(served)
+        port = server.socket.getsockname()[1]
+
+        FlakyHandler.refuse = {("RETR", "run.sh"), ("MLSD", "inputs"), ("RETR", "wrfbdy_d01")}
+        runs = [("cold", dict(expect_linked=0, expect_retries=True))]
+        runs += [("warm", dict(expect_linked=len(INPUTS)))]
+        runs += [("changed", dict(expect_linked=len(INPUTS) - 1, expect_changed=1))]
+        for label, expect in runs:
+            if label == "changed":
+                with open(os.path.join(job, "inputs", "wrfinput_d01"), "wb") as f:
+                    f.write(os.urandom(INPUTS["wrfinput_d01"] + 1000))
+            if label != "cold":
+                shutil.rmtree(os.path.join(work, "run"))  # start_cleaner.sh / end_cleaner.sh
+            result = download(port, work, label)
+            if args.verbose:
+                print(result.stdout)
+            problems += [f"{label}: {problem}" for problem in check(result, job, work, **expect)]
+    finally:
+        if server is not None:
+            server.close_all()
+        if args.keep:
+            print(f">> Kept {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if problems:
+        print(f"\n⚠️ {len(problems)} problems:")
+        for problem in problems:
+            print(f"   ❌ {problem}")
+        sys.exit(1)
+    print("\n✅ ftp_download.py: cold, warm and changed runs match the server")
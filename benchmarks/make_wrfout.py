@@ -0,0 +1,125 @@
+import os
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from netCDF4 import Dataset
+from pyproj import Proj
+
+# Lambert conformal domain centred on Slovenia, so every region in REGIONS is covered
+CENTER_LAT = 46.0
+CENTER_LON = 14.8
+
+
+def storm_cells(x, y, hour, cells):
+    """Gaussian cells drifting east with time, in [0, 1]; stands in for convection."""
+    field = np.zeros_like(x)
+    for i in range(cells):
+        angle = 2 * np.pi * i / cells
+        cx = 1.5e5 * np.cos(angle) + 2.0e4 * hour
+        cy = 1.0e5 * np.sin(angle)
+        radius = 2.5e4 * (1 + (i % 3))
+        field = np.maximum(field, np.exp(-((x - cx) ** 2 + (y - cy) ** 2) / radius ** 2))
+    return field
+
+
+def write_frame(path, valid, start, hour, x, y, lats, lons, nz, dx, rng, cells, grid_id=1):
+    ny, nx = lats.shape
+    with Dataset(path, "w") as ds:
+        ds.createDimension("Time", None)
+        ds.createDimension("DateStrLen", 19)
+        ds.createDimension("west_east", nx)
+        ds.createDimension("south_north", ny)
+        ds.createDimension("bottom_top", nz)
+        ds.createDimension("bottom_top_stag", nz + 1)
+        ds.setncatts({
+            "TITLE": " OUTPUT FROM WRF V4.4 MODEL (synthetic benchmark data)",
+            "MAP_PROJ": 1, "TRUELAT1": CENTER_LAT, "TRUELAT2": CENTER_LAT, "STAND_LON": CENTER_LON,
+            "MOAD_CEN_LAT": CENTER_LAT, "CEN_LAT": CENTER_LAT, "CEN_LON": CENTER_LON, "DX": dx, "DY": dx,
+            "POLE_LAT": 90.0, "POLE_LON": 0.0, "GRID_ID": grid_id, "PARENT_ID": max(grid_id - 1, 0),
+            "SIMULATION_START_DATE": f"{start:%Y-%m-%d_%H:%M:%S}",
+            "WEST_EAST_GRID_DIMENSION": nx + 1, "SOUTH_NORTH_GRID_DIMENSION": ny + 1,
+            "BOTTOM_TOP_GRID_DIMENSION": nz + 1,
+        })
+
+        times = ds.createVariable("Times", "S1", ("Time", "DateStrLen"))
+        times[0] = np.array(list(f"{valid:%Y-%m-%d_%H:%M:%S}"), dtype="S1")
+        xtime = ds.createVariable("XTIME", "f4", ("Time",))
+        xtime.units = f"minutes since {start:%Y-%m-%d %H:%M:%S}"
+        xtime.description = "minutes since simulation start"
+        xtime[0] = hour * 60.0
+
+        def variable(name, values, dims):
+            var = ds.createVariable(name, "f4", ("Time",) + dims)
+            var.FieldType = 104
+            var.MemoryOrder = "XY " if len(dims) == 2 else "XYZ"
+            var.stagger = "Z" if dims[0] == "bottom_top_stag" else ""
+            var.coordinates = "XLONG XLAT XTIME"
+            var[0] = values
+
+        plane = ("south_north", "west_east")
+        column = ("bottom_top",) + plane
+        staggered = ("bottom_top_stag",) + plane
+        levels = np.ones((nz, ny, nx))
+        cells_now = storm_cells(x, y, hour, cells)
+        accumulated = sum(storm_cells(x, y, h, cells) for h in range(hour + 1))
+
+        variable("XLAT", lats, plane)
+        variable("XLONG", lons, plane)
+        variable("HGT", 500 * np.exp(-(y / 1.5e5) ** 2) * (1 + np.sin(x / 4e4)), plane)
+        variable("T2", 288 + 6 * np.sin(x / 2e5 + hour / 4) - 8 * cells_now + rng.normal(0, 0.3, x.shape), plane)
+        variable("RAINNC", 4.0 * accumulated, plane)
+        variable("RAINC", 1.0 * accumulated, plane)
+
+        base_pressure = np.linspace(100000, 20000, nz)[:, None, None] * levels
+        variable("PB", base_pressure, column)
+        variable("P", np.zeros_like(base_pressure), column)
+        variable("T", np.linspace(0, 40, nz)[:, None, None] * levels, column)
+        variable("QVAPOR", 0.008 * np.linspace(1, 0.1, nz)[:, None, None] * levels, column)
+        variable("QRAIN", 0.003 * cells_now[None] * np.linspace(1, 0, nz)[:, None, None], column)
+        variable("QSNOW", 0.001 * cells_now[None] * np.linspace(0, 1, nz)[:, None, None], column)
+        variable("QGRAUP", 0.0005 * cells_now[None] * np.ones((nz, 1, 1)), column)
+        variable("PHB", np.linspace(0, 150000, nz + 1)[:, None, None] * np.ones((nz + 1, ny, nx)), staggered)
+        variable("PH", np.zeros((nz + 1, ny, nx)), staggered)
+
+
+def generate(out_dir, nx=150, ny=120, nz=20, frames=6, dx=3000.0, start=datetime(2025, 7, 30, 0), step_hours=1,
+             cells=5, seed=0, domain="d01"):
+    """Write frames synthetic wrfout_<domain>_* files to out_dir; returns their paths.
+
+    A nest (e.g. domain="d02" with a smaller dx) is centred on the same point as d01.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    projection = Proj(proj="lcc", lat_1=CENTER_LAT, lat_2=CENTER_LAT, lat_0=CENTER_LAT, lon_0=CENTER_LON,
+                      a=6370000, b=6370000)
+    x, y = np.meshgrid((np.arange(nx) - (nx - 1) / 2) * dx, (np.arange(ny) - (ny - 1) / 2) * dx)
+    lons, lats = projection(x, y, inverse=True)
+    rng = np.random.default_rng(seed)
+
+    paths = []
+    for frame in range(frames):
+        hour = frame * step_hours
+        valid = start + timedelta(hours=hour)
+        path = os.path.join(out_dir, f"wrfout_{domain}_{valid:%Y-%m-%d_%H:%M:%S}")
+        write_frame(path, valid, start, hour, x, y, lats, lons, nz, dx, rng, cells, grid_id=int(domain[1:]))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic wrfout files for benchmarking the plots")
+    parser.add_argument("out_dir", help="Directory for the files")
+    parser.add_argument("--nx", type=int, default=150, help="Grid points west-east")
+    parser.add_argument("--ny", type=int, default=120, help="Grid points south-north")
+    parser.add_argument("--nz", type=int, default=20, help="Vertical levels")
+    parser.add_argument("--dx", type=float, default=3000.0, help="Grid spacing in metres")
+    parser.add_argument("--frames", type=int, default=6, help="Number of hourly files")
+    parser.add_argument("--start", default="2025-07-30_00", help="Simulation start, YYYY-MM-DD_HH")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the T2 noise")
+    parser.add_argument("--domain", default="d01", help="Domain in the file names, e.g. d02 for a nest")
+    args = parser.parse_args()
+
+    paths = generate(args.out_dir, nx=args.nx, ny=args.ny, nz=args.nz, frames=args.frames, dx=args.dx,
+                     start=datetime.strptime(args.start, "%Y-%m-%d_%H"), seed=args.seed, domain=args.domain)
+    size = sum(os.path.getsize(path) for path in paths)
+    print(f"✅ Wrote {len(paths)} files ({size / 2 ** 20:.1f} MB) to {args.out_dir}")
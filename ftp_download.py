@@ -0,0 +1,393 @@
+import os
+import re
+import json
+import stat
+import shutil
+import hashlib
+import time
+import argparse
+import threading
+import ftplib
+from concurrent.futures import ThreadPoolExecutor
+
+from ftp_upload import FTPPool
+
+# "drwxr-xr-x 1 owner group 4096 Jul 30 02:00 name" (servers without MLSD)
+LIST_LINE = re.compile(r"^([\-dl])\S*\s+\d+\s+\S+\s+\S+\s+(\d+)\s+(\w{3}\s+\d+\s+[\d:]+)\s+(.+)$")
+
+
+def list_dir(ftp, path):
+    """(name, is_dir, size, mtime) for the entries of one remote directory."""
+    try:
+        entries = []
+        for name, facts in ftp.mlsd(path, facts=["type", "size", "modify"]):
+            kind = facts.get("type", "")
+            if kind in ("cdir", "pdir") or name in (".", ".."):
+                continue
+            entries.append((name, kind == "dir", int(facts.get("size", 0)), facts.get("modify", "")))
+        return entries
+    except ftplib.error_perm as e:
+        if not str(e).startswith(("500", "501", "502")):
+            raise
+
+    # MLSD not supported: LIST gives the size and a coarser timestamp
+    lines = []
+    ftp.retrlines(f"LIST {path}", lines.append)
+    entries = []
+    for line in lines:
+        match = LIST_LINE.match(line)
+        if match is None:
+            continue
+        kind, size, modified, name = match.groups()
+        if kind == "l" or name in (".", ".."):
+            continue
+        entries.append((name, kind == "d", int(size), " ".join(modified.split())))
+    return entries
+
+
+def list_tree(ftp, root):
+    """{relative path: {"size", "mtime"}} for every file below root, over one connection."""
+    files = {}
+    pending = [""]
+    while pending:
+        rel_dir = pending.pop()
+        for name, is_dir, size, mtime in list_dir(ftp, f"{root}/{rel_dir}".rstrip("/")):
+            rel = f"{rel_dir}/{name}" if rel_dir else name
+            if is_dir:
+                pending.append(rel)
+            else:
+                files[rel] = {"size": size, "mtime": mtime}
+    return files
+
+
+def add_checksums(ftp, root, files):
+    """Add a "hash" to each entry when the server supports the HASH command (draft-bryan-ftpext-hash)."""
+    try:
+        features = ftp.sendcmd("FEAT")
+    except ftplib.all_errors:
+        return
+    if not re.search(r"^\s*HASH\b", features, re.MULTILINE):
+        return
+    for rel, meta in files.items():
+        try:
+            # "213 SHA-256 0-1234 <hex digest> <path>"
+            parts = ftp.sendcmd(f"HASH {root}/{rel}").split()
+            meta["hash"] = f"{parts[1]}:{parts[3]}"
+        except ftplib.all_errors + (IndexError,):
+            # e.g. 450 while the file is still being written: keyed by size and mtime instead
+            meta.pop("hash", None)
+
+
+def with_retries(action, what, retries, retry_delay=2.0):
+    """Result of action(), called up to `retries` times on FTP and local I/O errors."""
+    for attempt in range(1, retries + 1):
+        try:
+            return action()
+        except (ftplib.all_errors + (OSError,)) as e:
+            print(f"[WARN] Attempt {attempt}/{retries} for {what} failed: {e}")
+            if attempt == retries:
+                raise
+            time.sleep(retry_delay)
+
+
+class InputCache:
+    """Input files kept on local disk across jobs, so unchanged inputs are not downloaded again.
+
+    Objects are stored as cache_dir/objects/<sha1 of key>, where the key is the server's
+    checksum when it provides one and otherwise host, remote path, size and mtime. A hit
+    is hardlinked into the run directory (copied if linking fails). The cache is capped
+    at max_bytes, dropping least recently used objects first. An object whose size or
+    mtime no longer matches the index (written through a link) is treated as a miss.
+    """
+
+    def __init__(self, cache_dir, max_bytes, host=""):
+        self.cache_dir = cache_dir
+        self.host = host
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    def key(self, remote_path, meta):
+        if meta.get("hash"):
+            return meta["hash"]
+        return f"{self.host}{remote_path}|{meta['size']}|{meta['mtime']}"
+
+    def object_path(self, key):
+        return os.path.join(self.cache_dir, "objects", hashlib.sha1(key.encode()).hexdigest())
+
+    def fetch(self, remote_path, meta, out):
+        """Link the cached copy to out; False on a miss."""
+        key = self.key(remote_path, meta)
+        path = self.object_path(key)
+        with self._lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return False
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+            if st is None or st.st_size != meta["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+                self._remove(key)
+                return False
+            entry["used"] = time.time()
+            self.hits += 1
+        _link_or_copy(path, out)
+        return True
+
+    def add(self, remote_path, meta, local_file):
+        key = self.key(remote_path, meta)
+        path = self.object_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            _link_or_copy(local_file, tmp_path)
+            os.replace(tmp_path, path)
+            st = os.stat(path)
+        except OSError as e:
+            print(f"[WARN] Could not cache {remote_path}: {e}")
+            return
+        with self._lock:
+            self.index[key] = {"path": remote_path, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                               "used": time.time()}
+
+    def _remove(self, key):
+        self.index.pop(key, None)
+        try:
+            os.remove(self.object_path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Drop least recently used objects until the cache fits max_bytes; returns bytes freed."""
+        with self._lock:
+            total = sum(entry["size"] for entry in self.index.values())
+            freed = 0
+            for key, entry in sorted(self.index.items(), key=lambda item: item[1]["used"]):
+                if total - freed <= self.max_bytes:
+                    break
+                freed += entry["size"]
+                self._remove(key)
+            return freed
+
+    def save(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with self._lock:
+            try:
+                with open(tmp_path, "w") as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_path, self.index_path)
+            except OSError as e:
+                print(f"[WARN] Could not write input cache index {self.index_path}: {e}")
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class ListingCache:
+    """Remote listing of the previous download, used to spot files that changed on the server.
+
+    Local copies whose remote size or mtime differs from the cached listing are removed
+    before downloading, so a changed input is never mistaken for a complete download.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, key):
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cached.get("files", {}) if cached.get("key") == key else {}
+
+    def save(self, key, files):
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"key": key, "listed_at": time.time(), "files": files}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[WARN] Could not write listing cache {self.path}: {e}")
+
+
+class Downloader:
+    """Parallel downloads over a pool of reused connections, resuming partial files with REST."""
+
+    def __init__(self, pool, remote_root, target_dir, workers=12, retries=10, retry_delay=2.0, input_cache=None):
+        self.pool = pool
+        self.input_cache = input_cache
+        self.remote_root = remote_root
+        self.target_dir = target_dir
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._dirs_lock = threading.Lock()
+
+    def local_path(self, rel):
+        return os.path.join(self.target_dir, rel)
+
+    @staticmethod
+    def part_path(out, meta):
+        # The remote version is part of the name, so only a partial of the same version is resumed
+        return f"{out}.{meta['size']}-{meta['mtime']}.part"
+
+    def is_complete(self, rel, meta):
+        try:
+            return os.path.getsize(self.local_path(rel)) == meta["size"]
+        except OSError:
+            return False
+
+    def download_one(self, item):
+        rel, meta = item
+        out = self.local_path(rel)
+        part = self.part_path(out, meta)
+        with self._dirs_lock:
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+        remote_path = f"{self.remote_root}/{rel}"
+        if self.input_cache is not None and self.input_cache.fetch(remote_path, meta, out):
+            return True
+
+        def fetch():
+            # Each attempt resumes from what the previous ones wrote
+            offset = os.path.getsize(part) if os.path.exists(part) else 0
+            if offset > meta["size"]:
+                os.remove(part)
+                offset = 0
+            with self.pool.connection() as ftp, open(part, "ab") as f:
+                if offset < meta["size"] or meta["size"] == 0:
+                    ftp.retrbinary(f"RETR {remote_path}", f.write, rest=offset or None)
+            if os.path.getsize(part) != meta["size"]:
+                raise OSError(f"size {os.path.getsize(part)} != {meta['size']}")
+            os.replace(part, out)
+
+        try:
+            with_retries(fetch, rel, self.retries, self.retry_delay)
+        except (ftplib.all_errors + (OSError,)):
+            return False
+        if self.input_cache is not None:
+            self.input_cache.add(remote_path, meta, out)
+        return True
+
+    def download(self, files):
+        """Download {rel: meta}; returns the relative paths that failed."""
+        items = sorted(files.items())
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            ok = list(pool.map(self.download_one, items))
+        return [rel for (rel, _), downloaded in zip(items, ok) if not downloaded]
+
+
+def invalidate_changed(downloader, previous, files):
+    """Remove local copies and partials of files whose remote metadata changed since the last listing."""
+    changed = [rel for rel, meta in files.items()
+               if rel in previous and (previous[rel]["size"], previous[rel]["mtime"]) != (meta["size"], meta["mtime"])]
+    for rel in changed:
+        out = downloader.local_path(rel)
+        directory, name = os.path.split(out)
+        try:
+            stale = [os.path.join(directory, entry) for entry in os.listdir(directory)
+                     if entry == name or (entry.startswith(f"{name}.") and entry.endswith(".part"))]
+        except OSError:
+            stale = []
+        for path in stale:
+            os.remove(path)
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download the run's inputs from FTP over pooled connections")
+    parser.add_argument("--target_dir", default="/app/run", help="Local directory for inputs/ (default: /app/run)")
+    parser.add_argument("--run_script", default="run.sh", help="Local path for the run's run.sh")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PARALLEL", "12")),
+                        help="Parallel downloads (one FTP connection each)")
+    parser.add_argument("--retries", type=int, default=10, help="Attempts per file")
+    parser.add_argument("--timeout", type=float, default=30, help="FTP socket timeout in seconds")
+    parser.add_argument("--listing_cache", default=os.environ.get("CACHE_LIST", "/tmp/ftp_inputs_listing.json"),
+                        help="Remote listing of the previous download, for change detection")
+    parser.add_argument("--input_cache", default=os.environ.get("INPUT_CACHE_DIR", "/app/input_cache"),
+                        help="Directory keeping inputs across jobs (hardlinked into target_dir); empty disables")
+    parser.add_argument("--input_cache_max_gb", type=float, default=float(os.environ.get("INPUT_CACHE_MAX_GB", "50")),
+                        help="Size cap of the input cache; least recently used files are dropped first")
+    parser.add_argument("--fails_file", default=f"/tmp/ftp_fails.{os.getpid()}",
+                        help="Where to write the paths that could not be downloaded")
+    args = parser.parse_args()
+
+    for name in ("FTP_HOST", "FTP_USER", "FTP_PASS", "FTP_DIR"):
+        if not os.environ.get(name):
+            parser.error(f"Missing {name}")
+
+    host = os.environ["FTP_HOST"]
+    ftp_dir = "/" + os.environ["FTP_DIR"].strip("/")
+    inputs_root = f"{ftp_dir}/inputs"
+    pool = FTPPool(host, os.environ["FTP_USER"], os.environ["FTP_PASS"], timeout=args.timeout)
+    input_cache = None
+    if args.input_cache:
+        input_cache = InputCache(args.input_cache, int(args.input_cache_max_gb * 2 ** 30), host=host)
+    downloader = Downloader(pool, inputs_root, os.path.join(args.target_dir, "inputs"),
+                            workers=args.workers, retries=args.retries, input_cache=input_cache)
+    os.makedirs(args.target_dir, exist_ok=True)
+
+    try:
+        print(">> Downloading run.sh...")
+
+        def fetch_run_script():
+            with pool.connection() as ftp, open(args.run_script, "wb") as f:
+                ftp.retrbinary(f"RETR {ftp_dir}/run.sh", f.write)
+
+        with_retries(fetch_run_script, "run.sh", args.retries)
+        os.chmod(args.run_script, os.stat(args.run_script).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+        print(f">> Listing ftp://{host}{inputs_root}/")
+        started = time.monotonic()
+
+        def list_inputs():
+            with pool.connection() as ftp:
+                files = list_tree(ftp, inputs_root)
+                if input_cache is not None:
+                    add_checksums(ftp, inputs_root, files)
+            return files
+
+        files = with_retries(list_inputs, "the listing", args.retries)
+        if not files:
+            raise SystemExit(f"[ERROR] No files found under ftp://{host}{inputs_root}/")
+        print(f">> Found {len(files)} files in {time.monotonic() - started:.1f} s.")
+
+        cache = ListingCache(args.listing_cache)
+        cache_key = f"{host}{inputs_root}"
+        changed = invalidate_changed(downloader, cache.load(cache_key), files)
+        if changed:
+            print(f">> {len(changed)} files changed on the server since the last listing")
+        cache.save(cache_key, files)
+
+        missing = {rel: meta for rel, meta in files.items() if not downloader.is_complete(rel, meta)}
+        print(f">> Downloading {len(missing)} files ({len(files) - len(missing)} already present): "
+              f"PARALLEL={args.workers}")
+        started = time.monotonic()
+        failed = downloader.download(missing)
+    finally:
+        pool.close()
+        if input_cache is not None:
+            print(f">> Input cache: {input_cache.hits} files linked from {args.input_cache}")
+            freed = input_cache.evict()
+            if freed:
+                print(f">> Input cache: dropped {freed / 2 ** 20:.0f} MB of least recently used files")
+            input_cache.save()
+
+    if failed:
+        with open(args.fails_file, "w") as f:
+            f.write("".join(f"{rel}\n" for rel in failed))
+        print(f"[WARN] {len(failed)} downloads failed. See: {args.fails_file}")
+    print(f">> Done in {time.monotonic() - started:.1f} s. Files at: {os.path.realpath(args.target_dir)}")
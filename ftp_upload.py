@@ -0,0 +1,241 @@
+import os
+import re
+import sys
+import time
+import queue
+import argparse
+import threading
+import ftplib
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Timestamp at the end of an image name, e.g. max_dbz_20250730_0200.png
+DATETIME_PATTERN = re.compile(r"(\d{4})(\d{2})(\d{2})_(\d{2})\d{2}$")
+
+# Frames are PNG, or WebP with the render script's --image_format webp
+IMAGE_EXTENSIONS = (".png", ".webp")
+
+
+class FTPPool:
+    """Logged-in FTP connections reused by the upload threads instead of one login per file."""
+
+    def __init__(self, host, user, password, timeout=60):
+        host, _, port = host.partition(":")
+        self.host = host
+        self.port = int(port) if port else 21
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+
+    def connect(self):
+        ftp = ftplib.FTP()
+        ftp.connect(self.host, self.port, timeout=self.timeout)
+        ftp.login(self.user, self.password)
+        return ftp
+
+    @contextmanager
+    def connection(self):
+        try:
+            ftp = self._idle.get_nowait()
+        except queue.Empty:
+            ftp = self.connect()
+        try:
+            yield ftp
+        except ftplib.error_perm:
+            # The server refused one command; the session itself is fine
+            self._idle.put(ftp)
+            raise
+        except BaseException:
+            ftp.close()
+            raise
+        self._idle.put(ftp)
+
+    def close(self):
+        while True:
+            try:
+                ftp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+class RemoteDirs:
+    """Remote directories known to exist, so each path component is created at most once per run."""
+
+    def __init__(self):
+        self._known = {"/"}
+        self._lock = threading.Lock()
+
+    def ensure(self, ftp, path):
+        if path in self._known:
+            return
+        # Held while creating, so threads uploading into the same new folder do not race on MKD
+        with self._lock:
+            current = ""
+            for part in path.strip("/").split("/"):
+                current = f"{current}/{part}"
+                if current in self._known:
+                    continue
+                try:
+                    ftp.mkd(current)
+                except ftplib.error_perm:
+                    # Usually already there; only remembered once CWD confirms it, so a
+                    # directory that could not be created is tried again on the next attempt
+                    try:
+                        ftp.cwd(current)
+                    except ftplib.error_perm:
+                        continue  # the failure shows up on STOR
+                self._known.add(current)
+
+
+class Uploader:
+    def __init__(self, pool, workers=4, retries=3, retry_delay=2.0):
+        self.pool = pool
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.remote_dirs = RemoteDirs()
+
+    def upload_one(self, job):
+        local_path, remote_dir, remote_name = job
+        for attempt in range(1, self.retries + 1):
+            try:
+                with self.pool.connection() as ftp:
+                    self.remote_dirs.ensure(ftp, remote_dir)
+                    with open(local_path, "rb") as f:
+                        ftp.storbinary(f"STOR {remote_dir}/{remote_name}", f)
+                print(f"✅ Uploaded: {remote_name}")
+                return True
+            except (ftplib.all_errors + (OSError,)) as e:
+                print(f"⚠️ Attempt {attempt}/{self.retries} for {remote_name} failed: {e}")
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * attempt)
+        print(f"❌ Failed: {remote_name}")
+        return False
+
+    def upload(self, jobs):
+        """Upload (local_path, remote_dir, remote_name) jobs in parallel; returns the failed jobs."""
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            ok = list(pool.map(self.upload_one, jobs))
+        return [job for job, uploaded in zip(jobs, ok) if not uploaded]
+
+
+def datetime_dir(name):
+    """YYYY/MM/DD/HH from the timestamp at the end of an image name, or None."""
+    match = DATETIME_PATTERN.search(os.path.splitext(name)[0])
+    return "/".join(match.groups()) if match else None
+
+
+def plan_tree(local_dir, remote_base):
+    """upload.sh layout: <base>/YYYY/MM/DD/HH/<subdir>/<name> for every image below local_dir."""
+    images = []
+    for root, _, names in os.walk(local_dir):
+        images.extend(os.path.join(root, name) for name in sorted(names) if name.endswith(IMAGE_EXTENSIONS))
+    images.sort()
+
+    dated = []
+    for path in images:
+        if datetime_dir(os.path.basename(path)) is None:
+            print(f"[WARN] Skipping {os.path.basename(path)} – no datetime found.")
+        else:
+            dated.append(path)
+    if not dated:
+        return []
+
+    # All images go under the folder of the earliest timestamp (the model run)
+    run_dir = min(datetime_dir(os.path.basename(path)) for path in dated)
+    print(f"🔵 First datetime folder: {run_dir}")
+    jobs = []
+    for path in dated:
+        subdir = os.path.relpath(os.path.dirname(path), local_dir)
+        remote_dir = f"{remote_base}/{run_dir}" if subdir == "." else f"{remote_base}/{run_dir}/{subdir}"
+        jobs.append((path, remote_dir, os.path.basename(path)))
+    return jobs
+
+
+def plan_flat(local_dir, remote_base):
+    """upload_for_dbz.sh layout: <base>/YYYY/MM/DD/HH/<name>, dated by the oldest image in local_dir."""
+    images = sorted(os.path.join(local_dir, name) for name in os.listdir(local_dir) if name.endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"[ERROR] No image files found in {local_dir}")
+    oldest = min(images, key=os.path.getmtime)
+    run_dir = datetime_dir(os.path.basename(oldest))
+    if run_dir is None:
+        raise SystemExit(f"[ERROR] Filename does not match expected pattern: {os.path.basename(oldest)}")
+    print(f"🕒 Oldest file: {oldest}")
+    return [(path, f"{remote_base}/{run_dir}", os.path.basename(path)) for path in images]
+
+
+def plan_latest(local_dir, remote_dir):
+    """upload_latest.sh layout: every image in local_dir straight into remote_dir."""
+    images = sorted(os.path.join(local_dir, name) for name in os.listdir(local_dir) if name.endswith(IMAGE_EXTENSIONS))
+    if not images:
+        raise SystemExit(f"[ERROR] No image files found in {local_dir}")
+    return [(path, remote_dir, os.path.basename(path)) for path in images]
+
+
+def reset_remote_dir(pool, remote_dirs, remote_dir):
+    """Remove and recreate remote_dir with a .keep file, as upload_latest.sh does."""
+    with pool.connection() as ftp:
+        print(f"🧹 Cleaning remote folder: {remote_dir}")
+        try:
+            ftp.rmd(remote_dir)
+        except ftplib.error_perm:
+            print("[INFO] Folder may not exist yet.")
+        remote_dirs.ensure(ftp, remote_dir)
+        with open(os.devnull, "rb") as empty:
+            ftp.storbinary(f"STOR {remote_dir}/.keep", empty)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload rendered images to FTP over pooled connections")
+    parser.add_argument("layout", choices=["tree", "flat", "latest"],
+                        help="'tree' as upload.sh, 'flat' as upload_for_dbz.sh, 'latest' as upload_latest.sh")
+    parser.add_argument("--local_dir", default=None,
+                        help="Directory with the images (default: /app/outputs, /app/outputs/mdbz for 'latest')")
+    parser.add_argument("--remote_dir", default=None,
+                        help="Remote base directory (default: /outputs, /outputs/latest for 'latest')")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel uploads (one FTP connection each)")
+    parser.add_argument("--retries", type=int, default=3, help="Attempts per file")
+    parser.add_argument("--timeout", type=float, default=60, help="FTP socket timeout in seconds")
+    args = parser.parse_args()
+
+    for name in ("FTP_HOST", "FTP_USER", "FTP_PASS"):
+        if not os.environ.get(name):
+            parser.error(f"Missing {name}")
+
+    latest = args.layout == "latest"
+    local_dir = args.local_dir or ("/app/outputs/mdbz" if latest else "/app/outputs")
+    remote_dir = (args.remote_dir or ("/outputs/latest" if latest else "/outputs")).rstrip("/")
+    if not os.path.isdir(local_dir):
+        raise SystemExit(f"[ERROR] {local_dir} does not exist.")
+
+    if args.layout == "tree":
+        jobs = plan_tree(local_dir, remote_dir)
+    elif args.layout == "flat":
+        jobs = plan_flat(local_dir, remote_dir)
+    else:
+        jobs = plan_latest(local_dir, remote_dir)
+
+    pool = FTPPool(os.environ["FTP_HOST"], os.environ["FTP_USER"], os.environ["FTP_PASS"], timeout=args.timeout)
+    uploader = Uploader(pool, workers=args.workers, retries=args.retries)
+    started = time.monotonic()
+    try:
+        if latest:
+            reset_remote_dir(pool, uploader.remote_dirs, remote_dir)
+        print(f"📤 Uploading {len(jobs)} files to ftp://{os.environ['FTP_HOST']}{remote_dir}/ "
+              f"({max(1, args.workers)} connection(s))")
+        failed = uploader.upload(jobs)
+    finally:
+        pool.close()
+
+    print(f"✅ Uploaded {len(jobs) - len(failed)} of {len(jobs)} files in {time.monotonic() - started:.1f} s")
+    if failed:
+        print(f"⚠️ {len(failed)} uploads failed:")
+        for local_path, _, _ in failed:
+            print(f"   ❌ {local_path}")
+        sys.exit(1)
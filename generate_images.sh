@@ -7,11 +7,38 @@ set -e
 source "$HOME/miniconda3/etc/profile.d/conda.sh"
 conda activate wrf_icond2
 
+# Frames are rendered in parallel, one process per core unless overridden
+RENDER_WORKERS="${RENDER_WORKERS:-$(nproc)}"
+
 # Run the Python script with /app/run as argument
 #python max_dbz_1_0_2_detailed_profi_slo_plus_args.py --data_dir /app/run --output_dir /app/outputs --logo_path /app
 #python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_args.py --data_dir /app/run --output_dir /app/outputs --logo_path /app
 #python acc_rain_1_0_2_detailed_slo_plus_args.py --data_dir /app/run --output_dir /app/outputs
 
-python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args.py --type mdbz --region slovenia_centered --data_dir /app/run --logo_path /app/logo_512_39.webp --weather_model wrf
-python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args.py --type temp --region slovenia_centered --data_dir /app/run --logo_path /app/logo_512_39.webp --weather_model wrf
-python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args.py --type precip --region slovenia_centered --data_dir /app/run --logo_path /app/logo_512_39.webp --weather_model wrf
\ No newline at end of file
+# With WATCH_DONE_FILE set (handler.py, render_during_run), frames are rendered while run.sh
+# is still writing wrfout files; the watch ends once that file exists, or once no file has
+# completed for WATCH_IDLE_TIMEOUT seconds (a stuck run)
+WATCH_ARGS=()
+if [ -n "${WATCH_DONE_FILE:-}" ]; then
+    WATCH_ARGS=(--watch --done_file "$WATCH_DONE_FILE" --idle_timeout "${WATCH_IDLE_TIMEOUT:-3600}")
+fi
+
+# All products in one pass: each wrfout file is opened once for mdbz, temp and precipitation
+# (since the start of the run and over the last 1-24 hours). The template path gives the same
+# images as drawing every frame from scratch; --resample pixel, --crop_margin and
+# --image_format png8/webp are faster but change the published images slightly, so they are
+# left at their lossless defaults here
+RENDER_ARGS=(--types mdbz,temp,precip,precip_1h,precip_3h,precip_6h,precip_12h,precip_24h --region slovenia_centered --data_dir /app/run --logo_path /app/logo_512_39.webp --weather_model wrf --workers "$RENDER_WORKERS" --render template "${WATCH_ARGS[@]}")
+
+# With RENDER_SOCKET set (handler.py starts render_service.sh once per worker), the job goes to
+# the already warm service; if no service answers, render in a new process as before
+if [ -n "${RENDER_SOCKET:-}" ]; then
+    status=0
+    python render_client.py --socket "$RENDER_SOCKET" --wait 60 -- "${RENDER_ARGS[@]}" || status=$?
+    if [ "$status" -ne 3 ]; then
+        exit "$status"
+    fi
+    echo "[WARN] Render service unavailable, rendering in a new process"
+fi
+
+python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args.py "${RENDER_ARGS[@]}"
@@ -1,12 +1,194 @@
 import runpod
 import subprocess
 import os
+import json
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+# Created once run.sh has exited; ends generate_images.sh's watch mode
+WATCH_DONE_FILE = "/tmp/wrf_run.done"
+
+INPUTS_DIR = "./run/inputs"
+# Written before upload_logs.sh, which uploads it with the other logs
+METRICS_FILE = "./run/job_metrics.json"
+# upload_logs.sh appends the path of every file it uploaded
+UPLOAD_MANIFEST = "/tmp/upload_logs.manifest"
+
+# Warm render service shared by all jobs of this worker; RENDER_SERVICE=0 disables it
+RENDER_SOCKET = "/tmp/wrf_render.sock"
+render_service = None
+
+
+def ensure_render_service():
+    """Start render_service.sh unless it is already running; returns whether it is (being) started."""
+    global render_service
+    if os.environ.get("RENDER_SERVICE", "1") == "0":
+        return False
+    if render_service is None or render_service.poll() is not None:
+        if render_service is not None:
+            logging.error(f"❌ Render service exited with {render_service.returncode}, restarting")
+        logging.info(">> Starting render_service.sh...")
+        render_service = subprocess.Popen(["./render_service.sh"], env=dict(os.environ, RENDER_SOCKET=RENDER_SOCKET))
+    return True
+
+
+def start_step(cmd, env=None):
+    return subprocess.Popen(cmd, env=env), time.monotonic()
+
+
+def finish_step(metrics, name, proc, started):
+    """Reap proc and record its wall time, CPU time (including its children) and exit status."""
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    metrics["steps"][name] = {
+        "wall_s": round(time.monotonic() - started, 3),
+        "cpu_user_s": round(usage.ru_utime, 3),
+        "cpu_sys_s": round(usage.ru_stime, 3),
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "exit_status": proc.returncode,
+    }
+    return proc.returncode
+
+
+def run_step(metrics, name, cmd, env=None):
+    """subprocess.run(cmd, check=True) that also records the step in metrics."""
+    proc, started = start_step(cmd, env)
+    if finish_step(metrics, name, proc, started) != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+class Step:
+    """A shell command in the job graph.
+
+    failure is the status reported when the command exits non-zero: "error", "warning", or
+    None to only log it and let dependent steps run. With strict=False any other exception
+    is logged and the step counts as done, as run.sh always did. before/after run around
+    the command; after runs even when it fails.
+    """
+
+    def __init__(self, name, cmd, deps=(), label=None, failure="error", strict=True, env=None,
+                 before=None, after=None):
+        self.name = name
+        self.cmd = cmd
+        self.deps = list(deps)
+        self.label = label or name
+        self.failure = failure
+        self.strict = strict
+        self.env = env
+        self.before = before
+        self.after = after
+
+
+class StepScheduler:
+    """Runs each step once its dependencies have succeeded, independent steps concurrently.
+
+    The first step failing with a status ends the job with that status: no further steps
+    are started, the running ones are waited for, and steps that never ran are logged as
+    skipped.
+    """
+
+    def __init__(self, steps, metrics):
+        names = {step.name for step in steps}
+        for step in steps:
+            unknown = set(step.deps) - names
+            if unknown:
+                raise ValueError(f"Step {step.name} depends on unknown steps: {sorted(unknown)}")
+        self.steps = steps
+        self.metrics = metrics
+
+    def run_one(self, step):
+        """Returns (succeeded, failure result or None)."""
+        try:
+            if step.before:
+                step.before()
+            logging.info(f">> Running {step.label}...")
+            run_step(self.metrics, step.name, step.cmd, step.env)
+            logging.info(f"✅ {step.label} executed successfully.")
+            return True, None
+        except subprocess.CalledProcessError as e:
+            logging.error(f"❌ Error during {step.label}: {e}")
+            if step.failure is None:
+                return True, None
+            return False, {"status": step.failure, "step": step.label, "details": str(e)}
+        except Exception as e:
+            if step.strict:
+                raise
+            logging.error(f"❌ Error during {step.label}: {e}")
+            return True, None
+        finally:
+            if step.after:
+                step.after()
+
+    def run(self):
+        succeeded = {}
+        failure = None
+        pending = list(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(self.steps)) as pool:
+            while True:
+                if failure is None:
+                    for step in [step for step in pending if all(succeeded.get(dep) for dep in step.deps)]:
+                        pending.remove(step)
+                        running[pool.submit(self.run_one, step)] = step
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    succeeded[step.name], result = future.result()
+                    if result is not None and failure is None:
+                        failure = result
+        for step in pending:
+            logging.info(f">> Skipping {step.label}.")
+        return failure or {"status": "success"}
+
+
+def scan_bytes(paths, since=None):
+    """Total size of the given files and directory trees; only files modified after since, if set."""
+    total = 0
+    for path in paths:
+        walk = os.walk(path) if os.path.isdir(path) else [(os.path.dirname(path), [], [os.path.basename(path)])]
+        for root, _, names in walk:
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                if since is None or st.st_mtime >= since:
+                    total += st.st_size
+    return total
+
+
+def write_metrics(metrics):
+    try:
+        with open(METRICS_FILE, "w") as f:
+            json.dump(metrics, f, indent=2)
+    except OSError as e:
+        logging.error(f"❌ Could not write {METRICS_FILE}: {e}")
+
+
+def uploaded_files():
+    try:
+        with open(UPLOAD_MANIFEST) as f:
+            return [line.rstrip("\n") for line in f if line.strip()]
+    except OSError:
+        return []
+
 def handler(job):
     """Handler function that will be used to process jobs."""
+    metrics = {"steps": {}}
+    job_started = time.monotonic()
+    result = run_job(job, metrics)
+    metrics["total_wall_s"] = round(time.monotonic() - job_started, 3)
+    result["metrics"] = metrics
+    logging.info("Metrics: %s", json.dumps(metrics))
+    return result
+
+
+def run_job(job, metrics):
     job_input = job.get("input", {})
 
     # Set environment variables from job input
@@ -31,49 +213,72 @@ def handler(job):
         os.environ.get("FTP_HOST"),
     )
 
-    try:
-        logging.info(">> Running start_cleaner.sh...")
-        subprocess.run(["./start_cleaner.sh"], check=True)
-        logging.info("✅ start_cleaner.sh executed successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during cleaner.sh: {e}")
-        return {"status": "error", "step": "start_cleaner", "details": str(e)}
+    # generate_images.sh submits to the warm service (and falls back to a new process without it)
+    if ensure_render_service():
+        os.environ["RENDER_SOCKET"] = RENDER_SOCKET
+    else:
+        os.environ.pop("RENDER_SOCKET", None)
 
-    try:
-        logging.info(">> Running ftp_download.sh...")
-        subprocess.run(["./ftp_download.sh"], check=True)
-        logging.info("✅ ftp_download.sh executed successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during ftp_download.sh: {e}")
-        return {"status": "error", "step": "ftp_download", "details": str(e)}
+    # A failed simulation reports "warning" rather than "error"
+    simulation = Step("run", ["./run.sh"], deps=["ftp_download"], label="run.sh", failure="warning", strict=False)
+    steps = [
+        Step("start_cleaner", ["./start_cleaner.sh"], label="start_cleaner"),
+        Step("ftp_download", ["./ftp_download.sh"], deps=["start_cleaner"], label="ftp_download",
+             before=lambda: metrics.update(download_started=time.time()), after=lambda: count_downloads(metrics)),
+        simulation,
+        Step("upload_logs", ["./upload_logs.sh"], deps=["run"], label="upload_logs.sh", failure="warning",
+             env=dict(os.environ, UPLOAD_MANIFEST=UPLOAD_MANIFEST),
+             before=lambda: start_log_upload(metrics), after=lambda: count_uploads(metrics)),
+    ]
+    cleanup_deps = ["upload_logs"]
 
-    try:
-        logging.info(">> Running run.sh...")
-        subprocess.run(["./run.sh"], check=True)
-        logging.info("✅ run.sh executed successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ CalledProcessError during run.sh: {e}")
-        return {"status": "warning", "step": "run.sh", "details": str(e)}
-    except Exception as e:
-        logging.error(f"❌ Error during run.sh: {e}")
+    # Optional: render images while the model is still writing wrfout files
+    if job_input.get("render_during_run"):
+        if os.path.exists(WATCH_DONE_FILE):
+            os.remove(WATCH_DONE_FILE)
+        # run.sh exiting (in any way) lets the watcher render the remaining files and exit
+        simulation.after = lambda: open(WATCH_DONE_FILE, "w").close()
+        # The watcher renders every frame, so post_processing.sh skips its render at the end
+        # of run.sh (two renderers would write the same images at the same time)
+        simulation.env = dict(os.environ, RENDER_DURING_RUN="1")
+        # Rendered in its own process: the service handles one request at a time, and a watch
+        # request holds it until run.sh has exited, so nothing run.sh sends could be served
+        watch_env = dict(os.environ, WATCH_DONE_FILE=WATCH_DONE_FILE)
+        watch_env.pop("RENDER_SOCKET", None)
+        steps.append(Step("generate_images_watch", ["./generate_images.sh"], deps=["ftp_download"],
+                          label="generate_images.sh (watch mode)", failure=None, env=watch_env))
+        # The renderer reads ./run, which end_cleaner.sh deletes
+        cleanup_deps.append("generate_images_watch")
 
-    try:
-        logging.info(">> Running upload_logs.sh...")
-        subprocess.run(["./upload_logs.sh"], check=True)
-        logging.info("✅ upload_logs.sh executed successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during upload_logs.sh: {e}")
-        return {"status": "warning", "step": "upload_logs.sh", "details": str(e)}
+    # Optional: upload the rendered images next to (not after) the log upload
+    if job_input.get("upload_images"):
+        render_step = "generate_images_watch" if job_input.get("render_during_run") else "run"
+        steps.append(Step("upload_images", ["./upload.sh"], deps=[render_step], label="upload.sh", failure="warning"))
+        cleanup_deps.append("upload_images")
+
+    steps.append(Step("end_cleaner", ["./end_cleaner.sh"], deps=cleanup_deps, label="end_cleaner"))
+
+    result = StepScheduler(steps, metrics).run()
+    if result["status"] == "success":
+        logging.info("🎉 All steps completed successfully.")
+    return result
+
+
+def count_downloads(metrics):
+    # Files linked from the input cache keep their old mtime; only fresh downloads are counted
+    metrics["bytes_inputs"] = scan_bytes([INPUTS_DIR])
+    metrics["bytes_downloaded"] = scan_bytes([INPUTS_DIR], since=metrics.pop("download_started"))
+
+
+def start_log_upload(metrics):
+    write_metrics(metrics)
+    if os.path.exists(UPLOAD_MANIFEST):
+        os.remove(UPLOAD_MANIFEST)
 
-    try:
-        logging.info(">> Running end_cleaner.sh...")
-        subprocess.run(["./end_cleaner.sh"], check=True)
-        logging.info("✅ cleaner.sh executed successfully.")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"❌ Error during end_cleaner.sh: {e}")
-        return {"status": "error", "step": "end_cleaner", "details": str(e)}
 
-    logging.info("🎉 All steps completed successfully.")
-    return {"status": "success"}
+def count_uploads(metrics):
+    metrics["bytes_uploaded"] = scan_bytes(uploaded_files())
 
+# Started before the first job so its imports overlap with the download
+ensure_render_service()
 runpod.serverless.start({"handler": handler})
@@ -1,6 +1,17 @@
 import os
+import io
+import re
+import itertools
+import csv
+import json
+import hashlib
+import time
+import cProfile
 from glob import glob
-from datetime import datetime
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import numpy as np
 import matplotlib
@@ -12,11 +23,20 @@ from scipy.ndimage import zoom
 import cartopy.crs as crs
 import cartopy.feature as cfeature
 from matplotlib import image as mpimg
-from shapely.geometry import Point, Polygon
+from matplotlib.artist import Artist
+from matplotlib.text import Text
+from PIL import Image
+from shapely.geometry import GeometryCollection, Polygon, box
+from shapely import wkb
+from shapely.errors import ShapelyError
+
+LOCAL_TZ = ZoneInfo("Europe/Ljubljana")
 
 # Optional: Can be extended for other sources (e.g., NetCDF, PNG, GRIB)
 from netCDF4 import Dataset
-from wrf import getvar, latlon_coords, get_cartopy, to_np
+import wrf
+from wrf import getvar, get_cartopy, to_np, Constants
+from wrf.projection import getproj
 
 REGIONS = {
     "slovenia_istria": {
@@ -31,10 +51,6 @@ REGIONS = {
             "right": 0.3,
             "top": 0.07,
             "bottom": 0.06
-        },
-        "edge_threshold": {
-            "lat": 0.20, #0.15
-            "lon": 0.20 #0.25
         }
     },
     "slovenia": {
@@ -49,10 +65,6 @@ REGIONS = {
             "right": 0.16,
             "top": 0.06,
             "bottom": 0.08
-        },
-        "edge_threshold": {
-            "lat": 0.15,
-            "lon": 0.25
         }
     },
     "slovenia_centered": {
@@ -67,15 +79,153 @@ REGIONS = {
             "right": 0.16,
             "top": 0.015,
             "bottom": 0.08
-        },
-        "edge_threshold": {
-            "lat": 0.15,
-            "lon": 0.25
         }
     }
     # Add more regions here as needed
 }
 
+class FrameProfiler:
+    """Where each frame's time goes: per-stage wall time and peak RSS, optionally cProfile.
+
+    Code marks stages with `with profile_stage(name):`; time in a nested stage counts
+    only for the inner one and the rest of the frame is "other". Every process (pool
+    workers included) appends its frames to profile_dir/frames.<pid>.jsonl; report()
+    merges them into frames.csv and frames.json, prints a summary per product and region and, with
+    cprofile, keeps the pstats dumps of the `keep` slowest frames.
+    """
+
+    STAGES = ("open", "getvar", "resample", "figure", "features", "labels", "colorbar", "composite", "savefig",
+              "other")
+
+    def __init__(self, profile_dir, cprofile=False, keep=3):
+        self.profile_dir = os.path.abspath(profile_dir)
+        self.cprofile = cprofile
+        self.keep = keep
+        self._stack = []
+        self._mark = 0.0
+        self._totals = None
+
+    def start(self):
+        os.makedirs(os.path.join(self.profile_dir, "pstats"), exist_ok=True)
+        for path in glob(os.path.join(self.profile_dir, "frames.*.jsonl")) + \
+                glob(os.path.join(self.profile_dir, "pstats", "*.prof")):
+            os.remove(path)
+
+    def _switch(self, push=None):
+        now = time.perf_counter()
+        self._totals[self._stack[-1]] += now - self._mark
+        self._mark = now
+        if push is None:
+            self._stack.pop()
+        else:
+            self._stack.append(push)
+
+    @contextmanager
+    def stage(self, name):
+        if not self._stack:
+            yield  # outside a frame (warm-up, per-run setup)
+            return
+        self._switch(push=name)
+        try:
+            yield
+        finally:
+            self._switch()
+
+    @staticmethod
+    def _reset_peak_rss():
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    @staticmethod
+    def _peak_rss_mb():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    @contextmanager
+    def frame(self, product, region, filepath):
+        record = {"product": product, "region": region, "file": os.path.basename(filepath), "pid": os.getpid()}
+        self._reset_peak_rss()
+        self._totals = defaultdict(float)
+        self._stack = ["other"]
+        profile = cProfile.Profile() if self.cprofile else None
+        started = self._mark = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            self._switch()
+            record["wall_ms"] = round(1000 * (time.perf_counter() - started), 1)
+            for name in self.STAGES:
+                record[f"{name}_ms"] = round(1000 * self._totals.get(name, 0.0), 1)
+            record["peak_rss_mb"] = round(self._peak_rss_mb(), 1)
+            if profile is not None:
+                name = f"{product}_{region}_{record['file']}".replace(":", "-")
+                record["pstats"] = os.path.join(self.profile_dir, "pstats", f"{name}.prof")
+                profile.dump_stats(record["pstats"])
+            with open(os.path.join(self.profile_dir, f"frames.{os.getpid()}.jsonl"), "a") as f:
+                f.write(json.dumps(record) + "\n")
+
+    def report(self):
+        records = []
+        for path in sorted(glob(os.path.join(self.profile_dir, "frames.*.jsonl"))):
+            with open(path) as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+            os.remove(path)
+        if not records:
+            return records
+        records.sort(key=lambda record: (record["product"], record["region"], record["file"]))
+
+        if self.cprofile:
+            slowest = sorted(records, key=lambda record: record["wall_ms"], reverse=True)
+            for record in slowest[self.keep:]:
+                os.remove(record.pop("pstats"))
+        with open(os.path.join(self.profile_dir, "frames.json"), "w") as f:
+            json.dump(records, f, indent=1)
+        columns = ["product", "region", "file", "pid", "wall_ms"] + [f"{name}_ms" for name in self.STAGES] + ["peak_rss_mb"]
+        with open(os.path.join(self.profile_dir, "frames.csv"), "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns + ["pstats"], extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(records)
+
+        print(f"⏱️ Mean ms per frame ({len(records)} frames) → {self.profile_dir}")
+        print(f"{'product':<26}{'region':<20}{'frames':>7}{'wall':>8}"
+              + "".join(f"{name:>10}" for name in self.STAGES) + f"{'max MB':>8}")
+        by_product = defaultdict(list)
+        for record in records:
+            by_product[record["product"], record["region"]].append(record)
+        for (product, region), rows in by_product.items():
+            means = [np.mean([row[f"{name}_ms"] for row in rows]) for name in ("wall",) + self.STAGES]
+            print(f"{product:<26}{region:<20}{len(rows):>7}" + "".join(f"{value:>{8 if i == 0 else 10}.0f}"
+                                                          for i, value in enumerate(means))
+                  + f"{max(row['peak_rss_mb'] for row in rows):>8.0f}")
+        if self.cprofile:
+            for record in records:
+                if "pstats" in record:
+                    print(f"   🔬 {record['product']} {record['region']} {record['file']}: {record['wall_ms']:.0f} ms → {record['pstats']}")
+        return records
+
+# Set in processes run with --profile_dir/--profile; pool workers inherit it
+_PROFILER = None
+_NO_STAGE = nullcontext()
+
+def profile_stage(name):
+    if _PROFILER is None:
+        return _NO_STAGE
+    return _PROFILER.stage(name)
+
 class DataSource:
     def __init__(self, filepath):
         self.filepath = filepath
@@ -98,31 +248,251 @@ class DataSource:
     def get_model_run_time(self):
         raise NotImplementedError
 
+# Memory kept for raw variables, intermediates and derived fields of one open file
+DIAGNOSTICS_MEMORY_BUDGET = int(os.environ.get("WRF_DIAGNOSTICS_MB", "1024")) * 2 ** 20
+
+class Diagnostics:
+    """Derived fields of one wrfout file, computed from shared intermediates.
+
+    Raw variables, full pressure, temperature, geopotential height, density and the
+    fields themselves are memoised per file. Entries are evicted least recently used
+    first once they exceed memory_budget bytes, so a product reusing the intermediates
+    of another (e.g. slp after mdbz) only pays for its own final step.
+    """
+
+    # Field name (as in wrf.getvar) -> method computing it
+    FIELDS = {
+        "mdbz": "max_dbz",
+        "dbz": "dbz",
+        "slp": "slp",
+        "tk": "temperature",
+        "tc": "temperature_c",
+        "pressure": "pressure_hpa",
+        "z": "height",
+        "rho": "density",
+        "td": "dewpoint",
+        "td2": "dewpoint_2m",
+        "rh": "relative_humidity",
+        "cape_2d": "cape_2d",
+    }
+
+    def __init__(self, read, memory_budget=DIAGNOSTICS_MEMORY_BUDGET):
+        self.read = read
+        self.memory_budget = memory_budget
+        self._memo = OrderedDict()
+        self._nbytes = 0
+
+    def clear(self):
+        self._memo.clear()
+        self._nbytes = 0
+
+    def _memoised(self, key, compute):
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        value = compute()
+        self._memo[key] = value
+        self._nbytes += value.nbytes
+        while self._nbytes > self.memory_budget and len(self._memo) > 1:
+            _, evicted = self._memo.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+        return value
+
+    def field(self, name):
+        return self._memoised(("field", name), getattr(self, self.FIELDS[name]))
+
+    def raw(self, name):
+        return self._memoised(("raw", name), lambda: self.read(name))
+
+    def raw_optional(self, name):
+        try:
+            return self.raw(name)
+        except KeyError:
+            return None
+
+    def positive(self, name):
+        return self._memoised(("positive", name), lambda: np.maximum(self.raw(name), 0))
+
+    # Intermediates
+
+    def full_pressure(self):
+        return self._memoised("full_pressure", lambda: self.raw("P") + self.raw("PB"))
+
+    def full_theta(self):
+        return self._memoised("full_theta", lambda: self.raw("T") + Constants.T_BASE)
+
+    def tk(self):
+        return self._memoised("tk", lambda: wrf.tk(self.full_pressure(), self.full_theta(), meta=False))
+
+    def geopotential_height(self):
+        return self._memoised("height", lambda: wrf.destagger((self.raw("PH") + self.raw("PHB")) / Constants.G, -3))
+
+    def air_density(self):
+        def compute():
+            qv = self.positive("QVAPOR")
+            virtual = self.tk() * (Constants.EPS + qv) / (Constants.EPS * (1.0 + qv))
+            return self.full_pressure() / (Constants.RD * virtual)
+        return self._memoised("density", compute)
+
+    # Fields
+
+    def dbz(self):
+        return wrf.dbz(self.full_pressure(), self.tk(), self.raw("QVAPOR"), self.raw("QRAIN"),
+                       self.raw_optional("QSNOW"), self.raw_optional("QGRAUP"), meta=False)
+
+    def max_dbz(self):
+        return np.amax(self.field("dbz"), axis=-3)
+
+    def slp(self):
+        return wrf.slp(self.geopotential_height(), self.tk(), self.full_pressure(), self.positive("QVAPOR"),
+                       meta=False)
+
+    def temperature(self):
+        return self.tk()
+
+    def temperature_c(self):
+        return self.tk() - 273.15
+
+    def pressure_hpa(self):
+        return self.full_pressure() * 0.01
+
+    def height(self):
+        return self.geopotential_height()
+
+    def density(self):
+        return self.air_density()
+
+    def dewpoint(self):
+        return wrf.td(self.full_pressure() * 0.01, self.positive("QVAPOR"), meta=False)
+
+    def dewpoint_2m(self):
+        return wrf.td(self.raw("PSFC") * 0.01, self.positive("Q2"), meta=False)
+
+    def relative_humidity(self):
+        return wrf.rh(self.positive("QVAPOR"), self.full_pressure(), self.tk(), meta=False)
+
+    def cape_2d(self):
+        return wrf.cape_2d(self.full_pressure() * 0.01, self.tk(), self.raw("QVAPOR"), self.geopotential_height(),
+                           self.raw("HGT"), self.raw("PSFC") * 0.01, ter_follow=True, meta=False)
+
+class WRFFile:
+    """An open wrfout file whose variables are read once and shared by every product.
+
+    Grid variables and the fields in Diagnostics.FIELDS come back as plain arrays from
+    the file's Diagnostics. With a window (i0, i1, j0, j1) set, every raw read is that
+    hyperslab of the mass grid (staggered dimensions get one extra point), so fields are
+    computed for the window only.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.ncfile = None
+        self.window = None
+        self._vars = {}
+        self.diagnostics = Diagnostics(self.read)
+        self._projection = None
+
+    def open(self):
+        if self.ncfile is None:
+            self.ncfile = Dataset(self.filepath)
+        return self
+
+    def close(self):
+        if self.ncfile is not None:
+            self.ncfile.close()
+            self.ncfile = None
+        self._vars.clear()
+        self.diagnostics.clear()
+
+    def set_window(self, window):
+        if window != self.window:
+            self.window = window
+            self._vars.clear()
+            self.diagnostics.clear()
+
+    def _is_grid_variable(self, name):
+        var = self.ncfile.variables.get(name)
+        return var is not None and var.dimensions[-2:] == ("south_north", "west_east")
+
+    def read(self, name):
+        """First time of a raw variable, limited to the window if one is set."""
+        var = self.ncfile.variables[name]
+        bounds = {}
+        if self.window is not None:
+            i0, i1, j0, j1 = self.window
+            bounds = {
+                "south_north": slice(i0, i1), "south_north_stag": slice(i0, i1 + 1),
+                "west_east": slice(j0, j1), "west_east_stag": slice(j0, j1 + 1),
+            }
+        index = tuple(0 if dim == "Time" else bounds.get(dim, slice(None)) for dim in var.dimensions)
+        return np.asarray(var[index])
+
+    def getvar(self, name):
+        if name in Diagnostics.FIELDS:
+            return self.diagnostics.field(name)
+        if self._is_grid_variable(name):
+            return self.diagnostics.raw(name)
+        if name not in self._vars:
+            self._vars[name] = getvar(self.ncfile, name)
+        return self._vars[name]
+
+    def get_latlon(self, data=None):
+        return self.diagnostics.raw("XLAT"), self.diagnostics.raw("XLONG")
+
+    def get_projection(self, data=None):
+        if self._projection is None:
+            self._projection = get_cartopy(wrfin=self.ncfile)
+        return self._projection
+
 class NetCDFWRFSource(DataSource):
-    def __init__(self, filepath, variable_name):
+    def __init__(self, filepath, variable_name, wrf_file=None):
         super().__init__(filepath)
         self.variable_name = variable_name
         self._data = None
+        self.subset = None
+        # A shared WRFFile is owned (and closed) by whoever opened it
+        self._owns_file = wrf_file is None
+        self.wrf_file = wrf_file if wrf_file is not None else WRFFile(filepath)
+
+    @property
+    def ncfile(self):
+        return self.wrf_file.ncfile
 
     def open(self):
-        self.ncfile = Dataset(self.filepath)
+        self.wrf_file.open()
 
     def close(self):
-        self.ncfile.close()
+        if self._owns_file:
+            self.wrf_file.close()
+
+    def set_window(self, window, subset=None):
+        self.wrf_file.set_window(window)
+        # (i0, i1, j0, j1) of this source's grid within a window shared with other regions
+        self.subset = subset
+
+    def read_data(self):
+        return self.wrf_file.getvar(self.variable_name)
+
+    def _apply_subset(self, array):
+        if self.subset is None:
+            return array
+        i0, i1, j0, j1 = self.subset
+        return array[..., i0:i1, j0:j1]
 
     def get_data(self):
         if self._data is None:
-            self._data = getvar(self.ncfile, self.variable_name)
+            self._data = self._apply_subset(self.read_data())
         return self._data
 
     def get_latlon(self):
-        return latlon_coords(self.get_data())
+        lats, lons = self.wrf_file.get_latlon()
+        return self._apply_subset(lats), self._apply_subset(lons)
 
     def get_projection(self):
-        return get_cartopy(self.get_data())
+        return self.wrf_file.get_projection(self.get_data())
 
     def get_valid_time(self):
-        time_var = getvar(self.ncfile, "times").values
+        time_var = self.wrf_file.getvar("times").values
         time_str = str(time_var[0]) if isinstance(time_var, (np.ndarray, list)) else str(time_var)
         if "T" in time_str:
             dt = datetime.strptime(time_str.split(".")[0], "%Y-%m-%dT%H:%M:%S")
@@ -136,74 +506,1138 @@ class NetCDFWRFSource(DataSource):
 class TemperatureWRFSource(NetCDFWRFSource):
     def get_data(self):
         kelvin = super().get_data()
-        self._raw_data = kelvin
         return kelvin - 273.15
 
-    def get_latlon(self):
-        return latlon_coords(self._raw_data)
+class PrecipitationWRFSource(NetCDFWRFSource):
+    """Total precipitation since model start: grid-scale (RAINNC) plus convective (RAINC) when present."""
+
+    def __init__(self, filepath, wrf_file=None):
+        super().__init__(filepath, "RAINNC", wrf_file)
+
+    def read_data(self):
+        rainc = self.wrf_file.diagnostics.raw_optional("RAINC")
+        rainnc = self.wrf_file.getvar("RAINNC")
+        return rainnc if rainc is None else rainnc + rainc
+
+# Global attributes that define the WRF grid; together with the grid shape and corner
+# coordinates they identify a domain across runs.
+GRID_ATTRS = ("MAP_PROJ", "TRUELAT1", "TRUELAT2", "STAND_LON", "MOAD_CEN_LAT", "CEN_LAT", "CEN_LON",
+              "DX", "DY", "POLE_LAT", "POLE_LON")
+
+def read_valid_time_utc(ncfile):
+    times = ncfile.variables["Times"][0]
+    time_str = times.tobytes().decode() if hasattr(times, "tobytes") else "".join(times)
+    return datetime.strptime(time_str.strip(), "%Y-%m-%d_%H:%M:%S").replace(tzinfo=ZoneInfo("UTC"))
+
+def read_grid_info(ncfile):
+    lats = ncfile.variables["XLAT"][0]
+    lons = ncfile.variables["XLONG"][0]
+    corners = [
+        (round(float(lats[i, j]), 5), round(float(lons[i, j]), 5))
+        for i, j in ((0, 0), (0, -1), (-1, 0), (-1, -1))
+    ]
+    attrs = {name: ncfile.getncattr(name) for name in GRID_ATTRS if name in ncfile.ncattrs()}
+    attrs = {name: value.item() if hasattr(value, "item") else value for name, value in attrs.items()}
+    shape = [int(n) for n in lats.shape]
+    key = json.dumps({"shape": shape, "attrs": attrs, "corners": corners}, sort_keys=True)
+    return {
+        "shape": shape,
+        "attrs": attrs,
+        "corners": corners,
+        "fingerprint": hashlib.sha1(key.encode()).hexdigest()[:16],
+    }
 
-    def get_projection(self):
-        return get_cartopy(self._raw_data)
+# Domain of a wrfout file name, e.g. "d02" in wrfout_d02_2025-07-30_00:00:00
+DOMAIN_PATTERN = re.compile(r"_(d\d\d)_")
+
+def file_domain(filepath):
+    match = DOMAIN_PATTERN.search(os.path.basename(filepath))
+    return match.group(1) if match else None
+
+def find_domains(data_dir):
+    """First wrfout file of each domain in data_dir, e.g. {"d01": ..., "d02": ...}."""
+    first_files = {}
+    for filepath in sorted(glob(os.path.join(data_dir, "wrfout*_d??_*"))):
+        domain = file_domain(filepath)
+        if domain is not None:
+            first_files.setdefault(domain, filepath)
+    return first_files
+
+class RunIndex:
+    """Ordered wrfout files of one domain of a run with their valid times and grid metadata.
+
+    Built once per invocation and domain and shared by every plotter of that domain. With
+    persist=True it is kept as a JSON sidecar in data_dir, so later products and reruns
+    only scan new files.
+    """
+
+    SIDECAR_NAME = ".wrf_run_index.json"
+    VERSION = 1
+
+    def __init__(self, data_dir, entries, grid, domain="d01"):
+        self.data_dir = data_dir
+        self.domain = domain
+        self.entries = entries
+        self.grid = grid
+        self._valid_times = {
+            entry["name"]: datetime.fromisoformat(entry["valid_time"]) for entry in entries
+        }
+
+    @property
+    def files(self):
+        return [os.path.join(self.data_dir, entry["name"]) for entry in self.entries]
+
+    @property
+    def grid_shape(self):
+        return tuple(self.grid["shape"])
+
+    @property
+    def grid_fingerprint(self):
+        return self.grid["fingerprint"]
+
+    @property
+    def model_run_time(self):
+        return self.valid_time(self.files[0])
+
+    def valid_time(self, filepath):
+        return self._valid_times[os.path.basename(filepath)].astimezone(LOCAL_TZ)
+
+    @classmethod
+    def sidecar_path(cls, data_dir, domain="d01"):
+        if domain == "d01":
+            return os.path.join(data_dir, cls.SIDECAR_NAME)
+        stem, ext = os.path.splitext(cls.SIDECAR_NAME)
+        return os.path.join(data_dir, f"{stem}_{domain}{ext}")
+
+    @classmethod
+    def build(cls, data_dir, domain="d01", persist=False, files=None):
+        """Index of the domain's wrfout files, or of the given files (e.g. those completed so far)."""
+        if files is None:
+            files = glob(os.path.join(data_dir, f"wrfout*_{domain}_*"))
+        wrf_files = sorted(files)
+        if not wrf_files:
+            raise FileNotFoundError(f"No WRF files found for domain {domain}.")
+
+        cached = cls._load_sidecar(data_dir, domain) if persist else {}
+        cached_entries = {entry["name"]: entry for entry in cached.get("entries", [])}
+
+        entries = []
+        scanned = 0
+        grid = None
+        for filepath in wrf_files:
+            stat = os.stat(filepath)
+            name = os.path.basename(filepath)
+            entry = cached_entries.get(name)
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                entry, file_grid = cls._scan(filepath, stat, with_grid=grid is None and not entries)
+                grid = grid or file_grid
+                scanned += 1
+            entries.append(entry)
+
+        if grid is None:
+            grid = cached["grid"]
+
+        index = cls(data_dir, entries, grid, domain)
+        if persist and scanned:
+            index.save()
+        return index
+
+    @staticmethod
+    def _scan(filepath, stat, with_grid=False):
+        with Dataset(filepath) as ncfile:
+            entry = {
+                "name": os.path.basename(filepath),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "valid_time": read_valid_time_utc(ncfile).isoformat(),
+            }
+            return entry, read_grid_info(ncfile) if with_grid else None
+
+    def add(self, filepath):
+        """Append a file that completed after the index was built."""
+        name = os.path.basename(filepath)
+        if name in self._valid_times:
+            return
+        entry, _ = self._scan(filepath, os.stat(filepath))
+        self.entries.append(entry)
+        self._valid_times[name] = datetime.fromisoformat(entry["valid_time"])
+
+    @classmethod
+    def _load_sidecar(cls, data_dir, domain="d01"):
+        try:
+            with open(cls.sidecar_path(data_dir, domain)) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cached if cached.get("version") == cls.VERSION else {}
+
+    def save(self):
+        path = self.sidecar_path(self.data_dir, self.domain)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": self.VERSION, "grid": self.grid, "entries": self.entries}, f, indent=1)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write run index {path}: {e}")
+
+class RunWatcher:
+    """wrfout files of a run that is still being written, yielded in time order once complete.
+
+    A file is complete when its size and mtime are unchanged over one poll interval and
+    its header and Times can be read. Files of all domains (or of those in domains, which
+    may be narrowed while iterating) are interleaved by the time in their names. Iteration
+    ends once the run has finished (done_file exists, or WRF wrote its success line to
+    rsl.out.0000) and every file is yielded, or when no file completes within idle_timeout
+    seconds.
+    """
+
+    SUCCESS_MARKER = b"SUCCESS COMPLETE WRF"
+
+    def __init__(self, data_dir, domains=None, poll_interval=30.0, done_file=None, idle_timeout=None):
+        self.data_dir = data_dir
+        self.domains = domains
+        self.poll_interval = poll_interval
+        self.done_file = done_file
+        self.idle_timeout = idle_timeout
+
+    def run_finished(self):
+        if self.done_file and os.path.exists(self.done_file):
+            return True
+        for name in ("rsl.out.0000", "rsl.error.0000"):
+            try:
+                with open(os.path.join(self.data_dir, name), "rb") as f:
+                    f.seek(max(os.path.getsize(f.name) - 4096, 0))
+                    if self.SUCCESS_MARKER in f.read():
+                        return True
+            except OSError:
+                continue
+        return False
+
+    def scan(self):
+        files = [
+            filepath for filepath in glob(os.path.join(self.data_dir, "wrfout*_d??_*"))
+            if self.domains is None or file_domain(filepath) in self.domains
+        ]
+        # By the time in the name first, so a nest's file comes right after its parent's
+        return sorted(files, key=lambda filepath: (DOMAIN_PATTERN.sub("_", os.path.basename(filepath)), filepath))
+
+    def is_readable(self, filepath):
+        try:
+            with Dataset(filepath) as ncfile:
+                read_valid_time_utc(ncfile)
+            return True
+        except (OSError, KeyError, IndexError, ValueError, RuntimeError):
+            return False
+
+    def __iter__(self):
+        sizes = {}
+        done = set()
+        last_progress = time.monotonic()
+        while True:
+            # Checked before scanning, so files written before the run ended are all seen
+            finished = self.run_finished()
+            waiting = None
+            for filepath in self.scan():
+                if filepath in done:
+                    continue
+                try:
+                    stat = os.stat(filepath)
+                except OSError:
+                    waiting = filepath
+                    break
+                signature = (stat.st_size, stat.st_mtime)
+                stable = finished or sizes.get(filepath) == signature
+                sizes[filepath] = signature
+                if not stable or not self.is_readable(filepath):
+                    # Later files wait for this one, so frames come in model time order
+                    waiting = filepath
+                    break
+                done.add(filepath)
+                last_progress = time.monotonic()
+                yield filepath
+
+            if finished:
+                if waiting is None:
+                    return
+                # The run will not write this file any further
+                print(f"⚠️ Skipping unreadable file {os.path.basename(waiting)}")
+                done.add(waiting)
+                continue
+            if self.idle_timeout and time.monotonic() - last_progress > self.idle_timeout:
+                print(f"⚠️ No wrfout file completed in {self.idle_timeout:.0f} s, stopping watch")
+                return
+            time.sleep(self.poll_interval)
+
+def subset_window(outer, inner):
+    """inner (i0, i1, j0, j1) relative to the enclosing window outer, or None if they are equal."""
+    if inner == outer:
+        return None
+    return inner[0] - outer[0], inner[1] - outer[0], inner[2] - outer[2], inner[3] - outer[2]
+
+def region_label_bounds(region_config):
+    """Lat/lon box (region extent plus label padding) in which grid labels are drawn."""
+    padding = region_config["label_padding"]
+    return (
+        region_config["lon_min"] - padding.get("left", 0.08),
+        region_config["lon_max"] + padding.get("right", 0.08),
+        region_config["lat_min"] - padding.get("bottom", 0.08),
+        region_config["lat_max"] + padding.get("top", 0.08),
+    )
+
+class GridGeometry:
+    """Grid coordinates, their zoomed copies and the projection of one WRF domain."""
+
+    def __init__(self, fingerprint, lats, lons, lat_zoomed, lon_zoomed, projection, cache_dir=None, window=None):
+        self.fingerprint = fingerprint
+        # (i0, i1, j0, j1) of the parent grid for a cropped geometry, None for the full grid
+        self.window = window
+        self.lats = lats
+        self.lons = lons
+        self.lat_zoomed = lat_zoomed
+        self.lon_zoomed = lon_zoomed
+        self.projection = projection
+        self.cache_dir = cache_dir
+        self._region_masks = {}
+        self._pixel_maps = {}
+        self._windows = {}
+
+    def region_window(self, region, region_config, margin, align=1):
+        """Index window (i0, i1, j0, j1) covering the region extent plus margin degrees.
+
+        The window starts on a multiple of align, so strided grid labels land on the
+        same points as on the full grid.
+        """
+        key = (region, margin, align)
+        if key not in self._windows:
+            inside = (
+                (self.lons >= region_config["lon_min"] - margin) & (self.lons <= region_config["lon_max"] + margin) &
+                (self.lats >= region_config["lat_min"] - margin) & (self.lats <= region_config["lat_max"] + margin)
+            )
+            rows = np.flatnonzero(inside.any(axis=1))
+            cols = np.flatnonzero(inside.any(axis=0))
+            window = None
+            if rows.size and cols.size:
+                # One extra cell on each side keeps the bilinear stencil inside the window
+                ny, nx = self.lats.shape
+                i0 = max(int(rows[0]) - 1, 0) // align * align
+                j0 = max(int(cols[0]) - 1, 0) // align * align
+                window = (i0, min(int(rows[-1]) + 2, ny), j0, min(int(cols[-1]) + 2, nx))
+                if window == (0, ny, 0, nx):
+                    window = None
+            self._windows[key] = window
+        return self._windows[key]
+
+    def region_mask(self, region, region_config):
+        bounds = region_label_bounds(region_config)
+        key = (region, bounds)
+        if key not in self._region_masks:
+            # The bounds are part of the name, so a changed extent or padding builds a new mask
+            name = f"mask_{region}_{hashlib.sha1(repr(bounds).encode()).hexdigest()[:8]}"
+            path = os.path.join(self.cache_dir, f"{name}.npy") if self.cache_dir else None
+            mask = _load_npy(path)
+            if mask is None:
+                lon_min, lon_max, lat_min, lat_max = bounds
+                mask = (
+                    (self.lons > lon_min) & (self.lons < lon_max) &
+                    (self.lats > lat_min) & (self.lats < lat_max)
+                )
+                _save_npy(path, mask)
+            self._region_masks[key] = mask
+        return self._region_masks[key]
+
+    def covers(self, region_config):
+        """Whether the grid's outline encloses the region extent with its label padding."""
+        lats, lons = np.asarray(self.lats), np.asarray(self.lons)
+        outline = [(lats[0, :], lons[0, :]), (lats[:, -1], lons[:, -1]),
+                   (lats[-1, ::-1], lons[-1, ::-1]), (lats[::-1, 0], lons[::-1, 0])]
+        polygon = Polygon(zip(np.concatenate([lon for _, lon in outline]),
+                              np.concatenate([lat for lat, _ in outline])))
+        lon_min, lon_max, lat_min, lat_max = region_label_bounds(region_config)
+        return polygon.contains(box(lon_min, lat_min, lon_max, lat_max))
+
+    def pixel_map(self, region, extent, shape):
+        """PixelMap for an output raster of `shape` covering `extent` in the grid's projection."""
+        key = (region, tuple(round(v, 3) for v in extent), shape)
+        if key not in self._pixel_maps:
+            name = f"pixmap_{region}_{shape[1]}x{shape[0]}_{hashlib.sha1(repr(key).encode()).hexdigest()[:8]}"
+            paths = [os.path.join(self.cache_dir, f"{name}_{part}.npy") if self.cache_dir else None
+                     for part in ("pixels", "index", "weights")]
+            arrays = [_load_npy(path) for path in paths]
+            if any(array is None for array in arrays):
+                arrays = PixelMap.compute_arrays(self, extent, shape)
+                for path, array in zip(paths, arrays):
+                    _save_npy(path, array)
+            self._pixel_maps[key] = PixelMap(shape, *arrays)
+        return self._pixel_maps[key]
+
+class PixelMap:
+    """Bilinear mapping from every output pixel to the four surrounding source grid cells.
+
+    WRF grids are regular in their own map projection, so each pixel centre of a raster
+    drawn in that projection has fractional grid indices from an affine fit of the grid's
+    projected coordinates. A frame is then one gather and weighted sum (resample()).
+    """
+
+    def __init__(self, shape, pixels, index, weights):
+        self.shape = shape
+        self.pixels = pixels      # flat raster positions that fall inside the grid
+        self.index = index        # (4, n) flat source indices of the surrounding cells
+        self.weights = weights    # (4, n) bilinear weights
+
+    @staticmethod
+    def compute_arrays(geometry, extent, shape):
+        proj = geometry.projection
+        ny, nx = geometry.lats.shape
+        xy = proj.transform_points(crs.PlateCarree(), np.asarray(geometry.lons, dtype=float),
+                                   np.asarray(geometry.lats, dtype=float))
+        # Affine fit x = x0 + j * dx, y = y0 + i * dy (the grid is regular in its projection)
+        jj, ii = np.meshgrid(np.arange(nx), np.arange(ny))
+        dx = np.mean(np.diff(xy[..., 0], axis=1))
+        dy = np.mean(np.diff(xy[..., 1], axis=0))
+        x0 = np.mean(xy[..., 0] - jj * dx)
+        y0 = np.mean(xy[..., 1] - ii * dy)
+
+        rows, cols = shape
+        x_min, x_max, y_min, y_max = extent
+        px = x_min + (np.arange(cols) + 0.5) * (x_max - x_min) / cols
+        py = y_min + (np.arange(rows) + 0.5) * (y_max - y_min) / rows
+        fj = (px - x0) / dx
+        fi = (py - y0) / dy
+        FI, FJ = np.meshgrid(fi, fj, indexing="ij")
+
+        inside = (FI >= 0) & (FI <= ny - 1) & (FJ >= 0) & (FJ <= nx - 1)
+        pixels = np.flatnonzero(inside)
+        fi, fj = FI.ravel()[pixels], FJ.ravel()[pixels]
+        i0 = np.clip(np.floor(fi).astype(np.int64), 0, max(ny - 2, 0))
+        j0 = np.clip(np.floor(fj).astype(np.int64), 0, max(nx - 2, 0))
+        wi = (fi - i0).astype(np.float32)
+        wj = (fj - j0).astype(np.float32)
+        i1 = np.minimum(i0 + 1, ny - 1)
+        j1 = np.minimum(j0 + 1, nx - 1)
+
+        index = np.stack([i0 * nx + j0, i0 * nx + j1, i1 * nx + j0, i1 * nx + j1]).astype(np.int32)
+        weights = np.stack([(1 - wi) * (1 - wj), (1 - wi) * wj, wi * (1 - wj), wi * wj])
+        return pixels, index, weights
+
+    def resample(self, data):
+        with profile_stage("resample"):
+            flat = np.asarray(data, dtype=np.float32).ravel()
+            values = np.einsum("kn,kn->n", self.weights, flat[self.index])
+            raster = np.full(self.shape[0] * self.shape[1], np.nan, dtype=np.float32)
+            raster[self.pixels] = values
+        # Row 0 is the southern edge; imshow is called with origin='lower'
+        return raster.reshape(self.shape)
+
+def _load_npy(path):
+    if path is None or not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+def _save_npy(path, array):
+    if path is None:
+        return
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    try:
+        np.save(tmp_path, np.asarray(array))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write geometry cache {path}: {e}")
+
+class GeometryCache:
+    """Grid geometry keyed by grid fingerprint.
+
+    The WRF grid does not change within a run, so zoomed coordinates, projection and
+    region masks are computed once, kept in memory across frames and stored as .npy
+    files (memory-mapped on load) so the next run on the same domain starts warm.
+    """
+
+    def __init__(self, cache_dir=None, factor=4.0):
+        self.cache_dir = cache_dir
+        self.factor = factor
+        self._memory = {}
+
+    def get(self, grid, wrf_file, window=None):
+        fingerprint = grid["fingerprint"]
+        key = fingerprint if window is None else (fingerprint, window)
+        if key not in self._memory:
+            if window is None:
+                self._memory[key] = self._load_or_build(grid, wrf_file)
+            else:
+                self._memory[key] = self._crop(self.get(grid, wrf_file), window)
+        return self._memory[key]
+
+    def _crop(self, geometry, window):
+        i0, i1, j0, j1 = window
+        crop_dir = None
+        if geometry.cache_dir:
+            crop_dir = os.path.join(geometry.cache_dir, f"crop_{i0}_{i1}_{j0}_{j1}")
+            try:
+                os.makedirs(crop_dir, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ Geometry cache disabled ({crop_dir}): {e}")
+                crop_dir = None
+
+        def path(name):
+            return os.path.join(crop_dir, f"{name}.npy") if crop_dir else None
+
+        lats = np.asarray(geometry.lats[i0:i1, j0:j1])
+        lons = np.asarray(geometry.lons[i0:i1, j0:j1])
+        suffix = f"zoom{self.factor:g}"
+        zoomed = [_load_npy(path(f"lat_{suffix}")), _load_npy(path(f"lon_{suffix}"))]
+        if any(array is None for array in zoomed):
+            zoomed = [zoom(lats, self.factor, order=1), zoom(lons, self.factor, order=1)]
+            for name, array in zip((f"lat_{suffix}", f"lon_{suffix}"), zoomed):
+                _save_npy(path(name), array)
+        return GridGeometry(f"{geometry.fingerprint}_{i0}_{i1}_{j0}_{j1}", lats, lons, *zoomed,
+                            geometry.projection, cache_dir=crop_dir, window=window)
+
+    def _load_or_build(self, grid, wrf_file):
+        fingerprint = grid["fingerprint"]
+        grid_dir = None
+        if self.cache_dir:
+            grid_dir = os.path.join(self.cache_dir, fingerprint)
+            try:
+                os.makedirs(grid_dir, exist_ok=True)
+            except OSError as e:
+                print(f"⚠️ Geometry cache disabled ({grid_dir}): {e}")
+                grid_dir = None
+
+        def path(name):
+            return os.path.join(grid_dir, f"{name}.npy") if grid_dir else None
+
+        suffix = f"zoom{self.factor:g}"
+        arrays = [_load_npy(path(name)) for name in ("lat", "lon", f"lat_{suffix}", f"lon_{suffix}")]
+        if any(array is None for array in arrays):
+            lats = np.asarray(wrf_file.ncfile.variables["XLAT"][0])
+            lons = np.asarray(wrf_file.ncfile.variables["XLONG"][0])
+            arrays = [lats, lons, zoom(lats, self.factor, order=1), zoom(lons, self.factor, order=1)]
+            for name, array in zip(("lat", "lon", f"lat_{suffix}", f"lon_{suffix}"), arrays):
+                _save_npy(path(name), array)
+
+        projection = getproj(**grid["attrs"]).cartopy()
+        return GridGeometry(fingerprint, *arrays, projection, cache_dir=grid_dir)
+
+def assign_domains(plotters, first_files):
+    """Set each plotter's run_domain: the domain it asks for, or the finest one covering its region.
+
+    first_files maps the run's domains to one of their files (find_domains). A region no
+    nest covers completely is rendered from the parent domain (d01). Each domain's grid
+    has its own entry in the geometry cache, keyed by its fingerprint.
+    """
+    parent = min(first_files, default="d01")
+    grids = {}
+    chosen = {}
+    for plotter in plotters:
+        if plotter.domain is not None or len(first_files) < 2:
+            plotter.run_domain = plotter.domain or parent
+            continue
+        if plotter.region not in chosen:
+            candidates = []
+            for domain, filepath in sorted(first_files.items()):
+                wrf_file = WRFFile(filepath).open()
+                try:
+                    if domain not in grids:
+                        grids[domain] = read_grid_info(wrf_file.ncfile)
+                    geometry = plotter.geometry_cache.get(grids[domain], wrf_file)
+                finally:
+                    wrf_file.close()
+                if geometry.covers(plotter.region_config):
+                    candidates.append((grids[domain]["attrs"].get("DX", 0), domain))
+            if candidates:
+                dx, domain = min(candidates)
+                note = f"{dx / 1000:g} km"
+            else:
+                domain, note = parent, "no domain covers it fully"
+            chosen[plotter.region] = domain
+            print(f"🗺️ {plotter.region}: domain {domain} ({note})")
+        plotter.run_domain = chosen[plotter.region]
+
+class LabelCollection(Artist):
+    """Many small value labels drawn by one artist that reuses a single Text."""
+
+    def __init__(self, x, y, labels, **text_kwargs):
+        super().__init__()
+        self.x = x
+        self.y = y
+        self.labels = labels
+        self._text = Text(**text_kwargs)
+
+    def draw(self, renderer):
+        if not self.get_visible():
+            return
+        text = self._text
+        text.set_figure(self.figure)
+        text.axes = self.axes
+        text.set_transform(self.get_transform())
+        text.set_clip_path(self.axes.patch)
+        text.set_zorder(self.get_zorder())
+        with profile_stage("labels"):
+            for x, y, label in zip(self.x, self.y, self.labels):
+                text.set_position((x, y))
+                text.set_text(label)
+                text.draw(renderer)
+        self.stale = False
 
 class GridLabeler:
-    def __init__(self, stride):
+    def __init__(self, stride, min_spacing=None):
         self.stride = stride
-
-    def annotate(self, ax, data, lats, lons, lat_min, lat_max, lon_min, lon_max, crs_proj, padding, threshold):
+        # Minimum distance between labels in degrees; None keeps every strided point
+        self.min_spacing = min_spacing
+
+    def select(self, data, lats, lons, lat_min, lat_max, lon_min, lon_max, padding, mask=None):
+        """Strided grid points inside the label box that have a value, as flat arrays."""
+        step = self.stride
+        lats_s = np.asarray(lats[::step, ::step])
+        lons_s = np.asarray(lons[::step, ::step])
+        values = np.asarray(data[::step, ::step], dtype=float)
+        if mask is not None:
+            inside = np.asarray(mask[::step, ::step])
+        else:
+            inside = (
+                (lons_s > lon_min - padding.get("left", 0.08)) & (lons_s < lon_max + padding.get("right", 0.08)) &
+                (lats_s > lat_min - padding.get("bottom", 0.08)) & (lats_s < lat_max + padding.get("top", 0.08))
+            )
+        keep = inside & ~np.isnan(values)
+        return lats_s[keep], lons_s[keep], values[keep]
+
+    def declutter(self, lats, lons):
+        """Indices of labels kept so that no two are closer than min_spacing (grid-bucket index)."""
+        spacing = self.min_spacing
+        buckets = {}
+        kept = []
+        for idx, (lat, lon) in enumerate(zip(lats, lons)):
+            bi, bj = int(lat // spacing), int(lon // spacing)
+            clear = True
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    for other in buckets.get((bi + di, bj + dj), ()):
+                        if (lats[other] - lat) ** 2 + (lons[other] - lon) ** 2 < spacing ** 2:
+                            clear = False
+                            break
+                    if not clear:
+                        break
+                if not clear:
+                    break
+            if clear:
+                buckets.setdefault((bi, bj), []).append(idx)
+                kept.append(idx)
+        return np.asarray(kept, dtype=int)
+
+    def points(self, data, lats, lons, lat_min, lat_max, lon_min, lon_max, padding, mask=None):
+        """Labelled points as (lats, lons, texts); empty when labelling is off."""
         if not self.stride:
-            return
+            return np.empty(0), np.empty(0), []
+
+        lats_l, lons_l, values = self.select(data, lats, lons, lat_min, lat_max, lon_min, lon_max, padding, mask)
+        if self.min_spacing:
+            keep = self.declutter(lats_l, lons_l)
+            lats_l, lons_l, values = lats_l[keep], lons_l[keep], values[keep]
+        return lats_l, lons_l, [f"{int(v)}" for v in np.round(values)]
+
+    def annotate(self, ax, data, lats, lons, lat_min, lat_max, lon_min, lon_max, crs_proj, padding, mask=None):
+        lats_l, lons_l, labels = self.points(data, lats, lons, lat_min, lat_max, lon_min, lon_max, padding, mask)
+        if not labels:
+            return []
+
+        xy = ax.projection.transform_points(crs_proj, lons_l, lats_l)
+        collection = LabelCollection(xy[:, 0], xy[:, 1], labels, fontsize=8, ha='center', va='center',
+                                     color='black', clip_on=True)
+        collection.set_transform(ax.transData)
+        collection.set_zorder(10)
+        ax.add_artist(collection)
+        return [collection]
+
+class FeatureCache:
+    """Natural Earth coastlines and borders clipped to each region and pre-projected.
+
+    Clipped lon/lat geometries are stored as WKB in cache_dir (committed in feature_cache/
+    next to the script, rebuilt with --build_feature_cache), so rendering needs neither
+    the global 10m shapefiles nor network access; a missing clip is an error rather than
+    a download. Projected copies are added per map projection on first use.
+    """
+
+    # name -> (Natural Earth category, Natural Earth name, line width)
+    FEATURES = {
+        "coastline": ("physical", "coastline", 0.4),
+        "borders": ("cultural", "admin_0_boundary_lines_land", 1.0),
+    }
+
+    def __init__(self, cache_dir, scale="10m", padding=1.0):
+        self.cache_dir = cache_dir
+        self.scale = scale
+        self.padding = padding
+        self._memory = {}
 
-        pad_left = padding.get("left", 0.08)
-        pad_right = padding.get("right", 0.08)
-        pad_top = padding.get("top", 0.08)
-        pad_bottom = padding.get("bottom", 0.08)
-
-        polygon = Polygon([
-            (lon_min - pad_left, lat_min - pad_bottom),
-            (lon_max + pad_right, lat_min - pad_bottom),
-            (lon_max + pad_right, lat_max + pad_top),
-            (lon_min - pad_left, lat_max + pad_top)
-        ])
-
-        for i in range(0, lats.shape[0], self.stride):
-            for j in range(0, lons.shape[1], self.stride):
-                lat = lats[i, j]
-                lon = lons[i, j]
-                point = Point(lon, lat)
-
-                if polygon.contains(point):
-                    edge_threshold_lat = threshold.get("lat", 0.15)
-                    edge_threshold_lon = threshold.get("lon", 0.25)
-                    is_edge = (
-                        abs(lat - lat_min) < edge_threshold_lat or
-                        abs(lat - lat_max) < edge_threshold_lat or
-                        abs(lon - lon_min) < edge_threshold_lon or
-                        abs(lon - lon_max) < edge_threshold_lon
-                    )
-                    if not is_edge:
-                        pass  # allow interior points as well now
+    def _clip_box(self, region_config):
+        return box(region_config["lon_min"] - self.padding, region_config["lat_min"] - self.padding,
+                   region_config["lon_max"] + self.padding, region_config["lat_max"] + self.padding)
+
+    def _path(self, region, region_config, name, proj_key=None):
+        # The clip box is part of the name, so a changed extent or padding clips again
+        clip_key = hashlib.sha1(repr(self._clip_box(region_config).bounds).encode()).hexdigest()[:8]
+        suffix = f"_{proj_key}" if proj_key else ""
+        return os.path.join(self.cache_dir, f"{region}_{self.scale}_{name}_{clip_key}{suffix}.wkb")
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                return list(wkb.loads(f.read()).geoms)
+        except (OSError, ValueError, ShapelyError):
+            return None  # missing, truncated or corrupt: built again
+
+    def _write(self, path, geometries):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(GeometryCollection(geometries).wkb)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ Could not write feature cache {path}: {e}")
+
+    def build_clipped(self, region, region_config, name):
+        from cartopy.io import shapereader
+
+        category, ne_name, _ = self.FEATURES[name]
+        clip = self._clip_box(region_config)
+        reader = shapereader.Reader(shapereader.natural_earth(resolution=self.scale, category=category, name=ne_name))
+        clipped = [geom.intersection(clip) for geom in reader.geometries() if geom.intersects(clip)]
+        geometries = [geom for geom in clipped if not geom.is_empty]
+        self._write(self._path(region, region_config, name), geometries)
+        return geometries
+
+    def get(self, region, region_config, name, projection):
+        proj_key = hashlib.sha1(projection.proj4_init.encode()).hexdigest()[:12]
+        key = (region, name, proj_key)
+        if key not in self._memory:
+            projected_path = self._path(region, region_config, name, proj_key)
+            geometries = self._read(projected_path)
+            if geometries is None:
+                clipped_path = self._path(region, region_config, name)
+                clipped = self._read(clipped_path)
+                if clipped is None:
+                    raise FileNotFoundError(f"No clipped {name} for {region} in {clipped_path}; "
+                                            f"build it with --build_feature_cache --feature_cache {self.cache_dir}")
+                source_crs = crs.PlateCarree()
+                projected = [projection.project_geometry(geom, source_crs) for geom in clipped]
+                geometries = [geom for geom in projected if not geom.is_empty]
+                self._write(projected_path, geometries)
+            self._memory[key] = geometries
+        return self._memory[key]
+
+    def add_features(self, ax, region, region_config, projection, color):
+        for name, (_, _, linewidth) in self.FEATURES.items():
+            geometries = self.get(region, region_config, name, projection)
+            ax.add_geometries(geometries, crs=projection, facecolor='none', edgecolor=color, linewidth=linewidth)
+
+    def build_all(self, regions):
+        for region, region_config in regions.items():
+            for name in self.FEATURES:
+                geometries = self.build_clipped(region, region_config, name)
+                path = self._path(region, region_config, name)
+                print(f"🗺️ {region} {name}: {len(geometries)} geometries → {path}")
+
+SAVE_DPI = 160
+SAVE_PAD_INCHES = 0.15
+
+def bbox_shape(bbox, dpi=SAVE_DPI):
+    """Pixel (rows, cols) of an image saved with bbox_inches=bbox, truncated like the Agg canvas."""
+    return int(bbox.height * dpi), int(bbox.width * dpi)
+
+class ImageWriter:
+    """How frames are encoded: "png" (RGBA), "png8" (8-bit, 256-colour adaptive palette)
+    or "webp" (lossless).
+
+    png8 and webp frames are rendered at a layout measured once per product and run
+    (OverlayCache.layout) instead of a tight bbox per frame. compress_level is the zlib
+    level 0-9 for PNG and the encoder effort 0-6 for WebP; None keeps Pillow's default.
+    """
+
+    EXTENSIONS = {"png": ".png", "png8": ".png", "webp": ".webp"}
+
+    def __init__(self, image_format="png", compress_level=None):
+        if image_format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        highest = 6 if image_format == "webp" else 9
+        if compress_level is not None and not 0 <= compress_level <= highest:
+            raise ValueError(f"compress_level for {image_format} must be 0-{highest}, got {compress_level}")
+        self.image_format = image_format
+        self.compress_level = compress_level
+        self.extension = self.EXTENSIONS[image_format]
+        self.fixed_layout = image_format != "png"
+
+    def savefig_kwargs(self):
+        if self.compress_level is None:
+            return {}
+        return {"pil_kwargs": {"compress_level": self.compress_level}}
+
+    def save(self, image, output_path):
+        if self.image_format == "webp":
+            options = {} if self.compress_level is None else {"method": self.compress_level}
+            image.save(output_path, format="WEBP", lossless=True, **options)
+            return
+        options = {} if self.compress_level is None else {"compress_level": self.compress_level}
+        if self.image_format == "png8":
+            # Frames are opaque; the palette holds the product colours plus antialiasing shades
+            image = image.convert("RGB").quantize(256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        image.save(output_path, format="PNG", dpi=(SAVE_DPI, SAVE_DPI), **options)
+
+def render_rgba(fig, bbox, shape, transparent=False):
+    buf = io.BytesIO()
+    fig.savefig(buf, format='rgba', dpi=SAVE_DPI, bbox_inches=bbox, transparent=transparent)
+    return np.frombuffer(buf.getvalue(), dtype=np.uint8).reshape(shape + (4,))
+
+class OverlayLayer:
+    """Straight-alpha RGBA layer, stored as only the pixels it covers, for compositing over frames."""
+
+    def __init__(self, rgba):
+        alpha = rgba[..., 3].ravel()
+        self.shape = rgba.shape
+        self.pixels = np.flatnonzero(alpha)
+        self.alpha = (alpha[self.pixels].astype(np.float32) / 255.0)[:, None]
+        self.rgb = rgba[..., :3].reshape(-1, 3)[self.pixels].astype(np.float32) * self.alpha
+
+    def composite(self, frame):
+        out = np.array(frame, copy=True)
+        flat = out.reshape(-1, 4)
+        under = flat[self.pixels, :3].astype(np.float32)
+        flat[self.pixels, :3] = (self.rgb + under * (1.0 - self.alpha) + 0.5).astype(np.uint8)
+        return out
+
+class FigureTemplate:
+    """Figure with basemap, colorbar, logo and static labels for one product and region.
+
+    Everything except the data mesh, the valid-time title and the grid labels is drawn
+    once; render() swaps those per frame and saves the figure. layers="map" builds only
+    the per-frame part and layers="decorations" only the static part (see OverlayCache);
+    layers="basemap" is the map without data mesh and time title (see FastRenderer).
+    """
+
+    def __init__(self, plotter, geometry, model_run_str, data, layers="all"):
+        with profile_stage("figure"):
+            self._build(plotter, geometry, model_run_str, data, layers)
+
+    def _build(self, plotter, geometry, model_run_str, data, layers):
+        self.key = None
+        self.pixel_map = None
+        self.zoom_factor = plotter.geometry_cache.factor
+        cmap, norm, ticks = plotter.get_colormap()
+        proj = geometry.projection
+        draw_map = layers in ("all", "map", "basemap")
+        draw_mesh = layers in ("all", "map")
+        draw_decorations = layers in ("all", "decorations")
+
+        fig, ax = plt.subplots(figsize=(12, 12), subplot_kw={'projection': proj})
+        fig.set_facecolor('#333333')
+        ax.set_extent([plotter.LON_MIN, plotter.LON_MAX, plotter.LAT_MIN, plotter.LAT_MAX], crs=crs.PlateCarree())
+
+        self.mesh = None
+        self.time_text = None
+        if draw_map:
+            with profile_stage("features"):
+                if plotter.feature_cache is not None:
+                    plotter.feature_cache.add_features(ax, plotter.region, plotter.region_config, proj,
+                                                       plotter.feature_color)
                 else:
-                    continue
+                    ax.coastlines(resolution='10m', linewidth=0.4, color=plotter.feature_color)
+                    ax.add_feature(cfeature.BORDERS.with_scale('10m'), linewidth=1.0,
+                                   edgecolor=plotter.feature_color)
+
+        if draw_mesh:
+            if plotter.resample == "pixel":
+                # Raster with one cell per output pixel of the map axes, in the axes' own projection
+                fig.set_dpi(SAVE_DPI)
+                ax.apply_aspect()
+                window = ax.get_window_extent()
+                extent = ax.get_xlim() + ax.get_ylim()
+                self.pixel_map = geometry.pixel_map(plotter.region, extent,
+                                                    (int(round(window.height)), int(round(window.width))))
+                self.mesh = ax.imshow(self.resample(data), extent=extent, origin='lower', cmap=cmap, norm=norm,
+                                      interpolation='nearest', transform=proj)
+                ax.set_xlim(extent[:2])
+                ax.set_ylim(extent[2:])
+            else:
+                self.mesh = ax.pcolormesh(geometry.lon_zoomed, geometry.lat_zoomed, self.resample(data),
+                                          cmap=cmap, norm=norm, transform=crs.PlateCarree(), antialiased=False)
+
+            self.time_text = ax.text(0.5, 1.01, "", transform=ax.transAxes, fontsize=13, color='white',
+                                     weight='bold', ha='center')
+        if not draw_decorations:
+            # The map frame is part of the overlay, drawn above the data
+            for spine in ax.spines.values():
+                spine.set_visible(False)
+        if draw_decorations:
+            with profile_stage("colorbar"):
+                sm = ScalarMappable(norm=norm, cmap=cmap)
+                sm.set_array([])
+                cbar_ax = fig.add_axes(plotter.cbar_position)
+                cbar = plt.colorbar(sm, cax=cbar_ax, orientation='horizontal', ticks=ticks)
+                cbar.set_label(plotter.colorbar_label(), color='white', labelpad=8, weight='bold')
+                cbar.ax.set_xticklabels([plotter.format_tick(x) for x in ticks], color='white')
+                cbar.outline.set_edgecolor('none')
+
+            logo_resized = plotter.create_logo()
+            if logo_resized is not None:
+                fig.figimage(logo_resized, xo=plotter.logo_position[0], yo=plotter.logo_position[1], zorder=20)
 
-                try:
-                    var_val = data[i, j]
-                    if np.isnan(var_val):
-                        continue
-                    label = f"{int(round(var_val))}"
-                except Exception:
-                    continue
+            ax.text(1.0, 1.01, plotter.friendly_name(), transform=ax.transAxes, fontsize=13,
+                    color='white', weight='bold', ha='right')
+            ax.text(0.01, -0.12, f"Zagon modela: {model_run_str}", transform=ax.transAxes,
+                    fontsize=10, ha='left', va='top', color='white', weight='bold')
+            ax.text(0.99, -0.12, "Vir podatkov: TempoQuest - ICON-D2", transform=ax.transAxes,
+                    fontsize=10, ha='right', va='top', color='white', weight='bold')
+
+        self.plotter = plotter
+        self.geometry = geometry
+        self.fig = fig
+        self.ax = ax
+
+    def resample(self, data):
+        if self.pixel_map is not None:
+            return self.pixel_map.resample(data)
+        with profile_stage("resample"):
+            return zoom(data, self.zoom_factor, order=1)
+
+    def update(self, data, label_data, time_hr):
+        """Swap the per-frame layer; returns the label artists to remove after saving."""
+        self.mesh.set_array(self.resample(data))
+        self.time_text.set_text(time_hr)
+        return self.plotter.annotate_labels(self.ax, self.geometry, label_data)
+
+    def render(self, data, label_data, time_hr, output_path):
+        labels = self.update(data, label_data, time_hr)
+        try:
+            with profile_stage("savefig"):
+                self.fig.savefig(output_path, bbox_inches='tight', dpi=SAVE_DPI, pad_inches=SAVE_PAD_INCHES,
+                                 **self.plotter.image_writer.savefig_kwargs())
+        finally:
+            for label in labels:
+                label.remove()
+
+    def render_rgba(self, data, label_data, time_hr, bbox, shape):
+        labels = self.update(data, label_data, time_hr)
+        try:
+            with profile_stage("savefig"):
+                return render_rgba(self.fig, bbox, shape)
+        finally:
+            for label in labels:
+                label.remove()
+
+    def tight_bbox(self):
+        self.fig.set_dpi(SAVE_DPI)
+        renderer = self.fig.canvas.get_renderer()
+        return self.fig.get_tightbbox(renderer).padded(SAVE_PAD_INCHES)
+
+    def close(self):
+        plt.close(self.fig)
+
+class OverlayCache:
+    """Static decorations rasterised once per product, region and run.
+
+    For each key the cache holds the fixed output bbox (taken from one fully decorated
+    frame, so no tight-bbox pass is needed per frame) and an RGBA layer with the
+    colorbar, logo, product title, footers and map frame, composited over every frame.
+    Entries of earlier runs are dropped when a new run shows up, so a long-lived render
+    service holds only the current run's layers.
+    """
+
+    def __init__(self):
+        self._memory = {}
+        self._layouts = {}
+        self._model_run_str = None
+
+    def _start_run(self, model_run_str):
+        if model_run_str != self._model_run_str:
+            self._memory.clear()
+            self._layouts.clear()
+            self._model_run_str = model_run_str
+
+    def layout(self, plotter, geometry, model_run_str, data, label_data, time_hr):
+        """Output (bbox, shape) of a fully decorated frame, measured once per key."""
+        self._start_run(model_run_str)
+        key = (plotter.get_variable_folder(), plotter.region, geometry.fingerprint, model_run_str)
+        if key not in self._layouts:
+            full = FigureTemplate(plotter, geometry, model_run_str, data)
+            try:
+                labels = full.update(data, label_data, time_hr)
+                bbox = full.tight_bbox()
+                for label in labels:
+                    label.remove()
+            finally:
+                full.close()
+            self._layouts[key] = (bbox, bbox_shape(bbox))
+        return self._layouts[key]
+
+    def get(self, plotter, geometry, model_run_str, data, label_data, time_hr):
+        self._start_run(model_run_str)
+        key = (plotter.get_variable_folder(), plotter.region, geometry.fingerprint, model_run_str)
+        if key not in self._memory:
+            bbox, shape = self.layout(plotter, geometry, model_run_str, data, label_data, time_hr)
+            decorations = FigureTemplate(plotter, geometry, model_run_str, data, layers="decorations")
+            try:
+                layer = OverlayLayer(render_rgba(decorations.fig, bbox, shape, transparent=True))
+            finally:
+                decorations.close()
+            self._memory[key] = (bbox, shape, layer)
+        return self._memory[key]
+
+class ColorTable:
+    """uint8 RGBA lookup table with the same binning as a colormap with a BoundaryNorm.
+
+    Built once with matplotlib: each bin (including under/over) is evaluated at one
+    representative value, NaN maps to the colormap's "bad" colour. lookup() is then a
+    searchsorted plus an index into the table.
+    """
+
+    def __init__(self, cmap, norm):
+        bounds = np.asarray(norm.boundaries, dtype=float)
+        representatives = np.concatenate(([bounds[0] - 1.0], (bounds[:-1] + bounds[1:]) / 2, [bounds[-1] + 1.0]))
+        bad = np.round(np.asarray(cmap.get_bad()) * 255).astype(np.uint8)
+        self.boundaries = bounds
+        self.colors = np.vstack([cmap(norm(representatives), bytes=True), bad])
+
+    def lookup(self, values):
+        # side='right' puts values equal to an edge in the bin above, like BoundaryNorm
+        index = np.searchsorted(self.boundaries, values, side='right')
+        index[np.isnan(values)] = len(self.colors) - 1
+        return self.colors[index]
+
+class FastRenderer:
+    """Frames drawn straight from NumPy onto pre-rasterised layers, without matplotlib.
+
+    matplotlib draws the layout once per product, region and run: an opaque background
+    (figure and empty map area), a transparent coastline/border layer and the static
+    decorations (see OverlayCache). Per frame the field is resampled to the map's pixels,
+    coloured through a ColorTable and composited; the valid time and grid labels are
+    drawn with Pillow in matplotlib's font.
+    """
+
+    def __init__(self, plotter, geometry, model_run_str, data, label_data, time_hr):
+        from matplotlib.font_manager import FontProperties, findfont
+        from PIL import ImageFont
+
+        self.key = None
+        self.bbox, self.shape, self.overlay = plotter.overlay_cache.get(plotter, geometry, model_run_str, data,
+                                                                        label_data, time_hr)
+        template = FigureTemplate(plotter, geometry, model_run_str, data, layers="basemap")
+        try:
+            fig, ax = template.fig, template.ax
+            fig.set_dpi(SAVE_DPI)
+            ax.apply_aspect()
+            # Map axes and title anchor in output pixels (origin top left)
+            window = ax.get_window_extent()
+            x_offset = self.bbox.x0 * SAVE_DPI
+            y_offset = self.bbox.y1 * SAVE_DPI
+            self.left = int(round(window.x0 - x_offset))
+            self.top = int(round(y_offset - window.y1))
+            width = int(round(window.width))
+            height = int(round(window.height))
+            title_x, title_y = ax.transAxes.transform((0.5, 1.01))
+            self.title_xy = (title_x - x_offset, y_offset - title_y)
+            self.extent = ax.get_xlim() + ax.get_ylim()
+
+            self.background = render_rgba(fig, self.bbox, self.shape)
+            self.features = OverlayLayer(render_rgba(fig, self.bbox, self.shape, transparent=True))
+        finally:
+            template.close()
+
+        self.pixel_map = geometry.pixel_map(plotter.region, self.extent, (height, width))
+        self.colors = ColorTable(*plotter.get_colormap()[:2])
+        self.projection = geometry.projection
+        self.plotter = plotter
+        self.geometry = geometry
+
+        points_per_pixel = SAVE_DPI / 72.0
+        self.title_font = ImageFont.truetype(findfont(FontProperties(weight='bold')), 13 * points_per_pixel)
+        self.label_font = ImageFont.truetype(findfont(FontProperties()), 8 * points_per_pixel)
+
+    def draw_labels(self, image, label_data):
+        with profile_stage("labels"):
+            self._draw_labels(image, label_data)
+
+    def _draw_labels(self, image, label_data):
+        lats, lons, labels = self.plotter.label_points(self.geometry, label_data)
+        if not labels:
+            return
+        from PIL import ImageDraw
+
+        rows, cols = self.pixel_map.shape
+        x0, x1, y0, y1 = self.extent
+        xy = self.projection.transform_points(crs.PlateCarree(), lons, lats)
+        px = self.left + (xy[:, 0] - x0) / (x1 - x0) * cols
+        py = self.top + (y1 - xy[:, 1]) / (y1 - y0) * rows
+
+        # Labels are clipped to the map axes, as in the matplotlib backends
+        box = (self.left, self.top, self.left + cols, self.top + rows)
+        window = image.crop(box)
+        draw = ImageDraw.Draw(window)
+        for x, y, text in zip(px - self.left, py - self.top, labels):
+            draw.text((x, y), text, fill='black', font=self.label_font, anchor='mm')
+        image.paste(window, box)
+
+    def render(self, data, label_data, time_hr, output_path):
+        from PIL import ImageDraw
+
+        rows, cols = self.pixel_map.shape
+        field = self.pixel_map.resample(data)
+        with profile_stage("composite"):
+            raster = self.colors.lookup(field)[::-1]
+            frame = self.background.copy()
+            window = frame[self.top:self.top + rows, self.left:self.left + cols]
+            np.copyto(window, raster, where=raster[..., 3:] > 0)
+            image = Image.fromarray(self.features.composite(frame), "RGBA")
+        self.draw_labels(image, label_data)
+
+        # The map frame and decorations go over the labels
+        with profile_stage("composite"):
+            image = Image.fromarray(self.overlay.composite(np.asarray(image)), "RGBA")
+            ImageDraw.Draw(image).text(self.title_xy, time_hr, fill='white', font=self.title_font, anchor='ms')
+        with profile_stage("savefig"):
+            self.plotter.image_writer.save(image, output_path)
+
+# Resized logos by path, shared by all plotters in the process
+_LOGO_CACHE = {}
 
-                ax.text(lon, lat, label, fontsize=8, ha='center', va='center', color='black',
-                        transform=crs_proj, zorder=10, clip_on=True)
 class WRFPlotter:
+    # Colour of coastlines and borders drawn over the data layer
+    feature_color = 'white'
+    # Whether stream_frame() reads the file (see MultiProductRenderer.stream_frame)
+    streams = False
+
     def __init__(self, data_dir, output_dir="outputs", logo_path='logo_512_39.webp', region="Slovenia_Istria", stride=None,
-                 weather_model="unknown"):
+                 weather_model="unknown", persist_index=False, geometry_cache=None, render_mode="figure",
+                 feature_cache=None, label_spacing=None, resample="zoom", backend="matplotlib",
+                 crop_margin=None, image_writer=None, domain=None):
         self.data_dir = data_dir
+        # WRF domain to render (e.g. "d02"); None picks the finest one covering the region
+        self.domain = domain
+        self.run_domain = domain or "d01"
+        self.image_writer = image_writer if image_writer is not None else ImageWriter()
+        # Degrees around the region read from each file; None reads the full domain
+        self.crop_margin = crop_margin
+        self.backend = backend
+        self._fast_renderer = None
+        self.resample = resample
+        self.feature_cache = feature_cache
+        self.render_mode = render_mode
+        self._template = None
+        self._colormap = None
+        self.overlay_cache = OverlayCache()
+        # Window read from each file when it is shared with plotters of other regions
+        # (MultiProductRenderer.share_read_window); None reads this plotter's own window
+        self.read_window = None
+        self.persist_index = persist_index
+        self.run_index = None
+        self.geometry_cache = geometry_cache if geometry_cache is not None else GeometryCache()
         self.base_output_dir = os.path.abspath(output_dir)
         self.logo_path = logo_path
         self.region = region
         self.weather_model = weather_model
-        self.grid_labeler = GridLabeler(stride)
+        self.grid_labeler = GridLabeler(stride, min_spacing=label_spacing)
 
         self.region_config = REGIONS.get(region)
 
@@ -230,15 +1664,36 @@ class WRFPlotter:
 
 
     def create_logo(self):
+        if self.logo_path in _LOGO_CACHE:
+            return _LOGO_CACHE[self.logo_path]
         try:
             logo = mpimg.imread(self.logo_path)
             scale = min(330 / logo.shape[1], 30 / logo.shape[0])
-            return zoom(logo, (scale, scale, 1))
+            logo_resized = zoom(logo, (scale, scale, 1))
         except Exception as e:
             print(f"Logo load failed: {e}")
-            return None
+            logo_resized = None
+        _LOGO_CACHE[self.logo_path] = logo_resized
+        return logo_resized
+
+    def get_colormap(self):
+        if self._colormap is None:
+            self._colormap = self.configure_colormap()
+        return self._colormap
 
-    def create_source(self, filepath):
+    def get_run_index(self):
+        if self.run_index is None or self.run_index.domain != self.run_domain:
+            self.run_index = RunIndex.build(self.data_dir, self.run_domain, persist=self.persist_index)
+        return self.run_index
+
+    def get_valid_time(self, source):
+        try:
+            return self.get_run_index().valid_time(source.filepath)
+        except KeyError:
+            # File appeared after the index was built
+            return source.get_valid_time()
+
+    def create_source(self, filepath, wrf_file=None):
         raise NotImplementedError
 
     def configure_colormap(self):
@@ -251,104 +1706,450 @@ class WRFPlotter:
         return ""
 
     def plot_file(self, filepath):
-        try:
-            source = self.create_source(filepath)
-            source.open()
-
-            data = source.get_data()
-            lats, lons = source.get_latlon()
-            proj = source.get_projection()
-
-            model_run_local = self.get_model_run_time_from_first_file()
-            model_run_str = model_run_local.strftime("%-d. %-m. %Y ob %H:%M")
-
-            dt_local = source.get_valid_time()
-            time_str = dt_local.strftime("%Y%m%d_%H%M")
-            time_hr = dt_local.strftime("%-d. %-m. %Y ob %H:%M")
-
-            factor = 4.0
-            data_zoomed = zoom(to_np(data), factor, order=1)
-            lat_zoomed = zoom(to_np(lats), factor, order=1)
-            lon_zoomed = zoom(to_np(lons), factor, order=1)
-
-            cmap, norm, ticks = self.configure_colormap()
-
-            fig, ax = plt.subplots(figsize=(12, 12), subplot_kw={'projection': proj})
-            fig.set_facecolor('#333333')
-            ax.set_extent([self.LON_MIN, self.LON_MAX, self.LAT_MIN, self.LAT_MAX], crs=crs.PlateCarree())
-
-            ax.coastlines(resolution='10m', linewidth=0.4, color='white')
-            ax.add_feature(cfeature.BORDERS.with_scale('10m'), linewidth=1.0, edgecolor='white')
-
-            ax.pcolormesh(lon_zoomed, lat_zoomed, data_zoomed, cmap=cmap,
-                          norm=norm, transform=crs.PlateCarree(), antialiased=False)
-
-            self.grid_labeler.annotate(
-                ax=ax,
-                data=to_np(data),         # unzoomed
-                lats=to_np(lats),         # unzoomed
-                lons=to_np(lons),         # unzoomed
-                lat_min=self.LAT_MIN,
-                lat_max=self.LAT_MAX,
-                lon_min=self.LON_MIN,
-                lon_max=self.LON_MAX,
-                crs_proj=crs.PlateCarree(),
-                padding=self.region_config["label_padding"],
-                threshold=self.region_config["edge_threshold"]
-            )
-
-            sm = ScalarMappable(norm=norm, cmap=cmap)
-            sm.set_array([])
-            cbar_ax = fig.add_axes(self.cbar_position)
-            cbar = plt.colorbar(sm, cax=cbar_ax, orientation='horizontal', ticks=ticks)
-            cbar.set_label(self.colorbar_label(), color='white', labelpad=8, weight='bold')
-            cbar.ax.set_xticklabels([f"{x:.0f}" for x in ticks], color='white')
-            cbar.outline.set_edgecolor('none')
-
-            logo_resized = self.create_logo()
-            if logo_resized is not None:
-                fig.figimage(logo_resized, xo=self.logo_position[0], yo=self.logo_position[1], zorder=20)
-
-            ax.text(0.5, 1.01, time_hr, transform=ax.transAxes, fontsize=13, color='white', weight='bold', ha='center')
-            ax.text(1.0, 1.01, self.friendly_name(), transform=ax.transAxes, fontsize=13,
-                    color='white', weight='bold', ha='right')
-            ax.text(0.01, -0.12, f"Zagon modela: {model_run_str}", transform=ax.transAxes,
-                    fontsize=10, ha='left', va='top', color='white', weight='bold')
-            ax.text(0.99, -0.12, "Vir podatkov: TempoQuest - ICON-D2", transform=ax.transAxes,
-                    fontsize=10, ha='right', va='top', color='white', weight='bold')
+        _, output_path, _ = _render_frame(self, filepath)
+        return output_path
+
+    def prepare_run(self, wrf_files):
+        """Hook for per-run state shared by all frames; returns the files to render."""
+        return wrf_files
+
+    def get_frame_data(self, source):
+        """Field to plot for this frame, or None to skip the frame."""
+        return source.get_data()
+
+    def stream_frame(self, filepath, wrf_file=None):
+        """Per-frame state computed in the main process, called for every file in run order.
+
+        The result is handed to receive_frame() before the frame is rendered (in a pool
+        worker or not); products whose frames depend on earlier files use this pair.
+        """
+        return None
+
+    def receive_frame(self, filepath, state):
+        pass
+
+    def get_label_data(self, data):
+        """Values passed to the grid labeler (NaN cells are not labelled)."""
+        return to_np(data)
+
+    def format_tick(self, x):
+        return f"{x:.0f}"
+
+    def get_geometry(self, wrf_file):
+        """Geometry of the grid that is read: the full domain, or its window around the region."""
+        grid = self.get_run_index().grid
+        geometry = self.geometry_cache.get(grid, wrf_file)
+        if self.crop_margin is None:
+            return geometry
+        window = geometry.region_window(self.region, self.region_config, self.crop_margin,
+                                        align=self.grid_labeler.stride or 1)
+        return self.geometry_cache.get(grid, wrf_file, window)
+
+    def open_source(self, filepath, wrf_file=None):
+        """Open a source limited to the grid of get_geometry(); returns (source, geometry)."""
+        source = self.create_source(filepath, wrf_file)
+        source.open()
+        geometry = self.get_geometry(source.wrf_file)
+        if self.read_window is None:
+            source.set_window(geometry.window)
+        else:
+            window = geometry.window or (0, geometry.lats.shape[0], 0, geometry.lats.shape[1])
+            source.set_window(self.read_window, subset_window(self.read_window, window))
+        return source, geometry
 
-            output_path = os.path.join(self.output_dir, f"{self.get_variable_folder()}_{time_str}.png")
-            plt.savefig(output_path, bbox_inches='tight', dpi=160, pad_inches=0.15)
-            plt.close()
+    def warm_up(self, filepath):
+        """Fill per-run caches up front so pool workers inherit them instead of rebuilding."""
+        wrf_file = WRFFile(filepath).open()
+        try:
+            geometry = self.get_geometry(wrf_file)
+            geometry.region_mask(self.region, self.region_config)
+        finally:
+            wrf_file.close()
+
+    def render_file(self, filepath, wrf_file=None):
+        with profile_stage("open"):
+            source, geometry = self.open_source(filepath, wrf_file)
+        try:
+            return self._render_file(source, geometry)
+        finally:
             source.close()
 
-        except Exception as e:
-            print(f"❌ Failed to process {filepath}: {e}")
+    def _render_file(self, source, geometry):
+        with profile_stage("getvar"):
+            data = self.get_frame_data(source)
+        if data is None:
+            return None
 
-    def run_all(self):
-        wrf_files = sorted(glob(os.path.join(self.data_dir, "wrfout*_d01_*")))
-        if not wrf_files:
-            raise FileNotFoundError("No WRF files found.")
+        model_run_local = self.get_model_run_time_from_first_file()
+        model_run_str = model_run_local.strftime("%-d. %-m. %Y ob %H:%M")
+
+        dt_local = self.get_valid_time(source)
+        time_str = dt_local.strftime("%Y%m%d_%H%M")
+        time_hr = dt_local.strftime("%-d. %-m. %Y ob %H:%M")
+
+        with profile_stage("getvar"):
+            field = to_np(data)
+            label_data = self.get_label_data(data)
+        output_path = os.path.join(self.output_dir,
+                                   f"{self.get_variable_folder()}_{time_str}{self.image_writer.extension}")
+
+        if self.backend == "fast":
+            renderer = self.get_fast_renderer(geometry, model_run_str, field, label_data, time_hr)
+            renderer.render(field, label_data, time_hr, output_path)
+        elif self.render_mode != "overlay" and self.image_writer.fixed_layout:
+            bbox, shape = self.overlay_cache.layout(self, geometry, model_run_str, field, label_data, time_hr)
+            if self.render_mode == "template":
+                frame = self.get_template(geometry, model_run_str, field).render_rgba(field, label_data, time_hr,
+                                                                                      bbox, shape)
+            else:
+                template = FigureTemplate(self, geometry, model_run_str, field)
+                try:
+                    frame = template.render_rgba(field, label_data, time_hr, bbox, shape)
+                finally:
+                    template.close()
+            with profile_stage("savefig"):
+                self.image_writer.save(Image.fromarray(frame, "RGBA"), output_path)
+        elif self.render_mode == "template":
+            template = self.get_template(geometry, model_run_str, field)
+            template.render(field, label_data, time_hr, output_path)
+        elif self.render_mode == "overlay":
+            bbox, shape, overlay = self.overlay_cache.get(self, geometry, model_run_str, field,
+                                                          label_data, time_hr)
+            template = self.get_template(geometry, model_run_str, field, layers="map")
+            frame = template.render_rgba(field, label_data, time_hr, bbox, shape)
+            with profile_stage("composite"):
+                image = Image.fromarray(overlay.composite(frame), "RGBA")
+            with profile_stage("savefig"):
+                self.image_writer.save(image, output_path)
+        else:
+            template = FigureTemplate(self, geometry, model_run_str, field)
+            try:
+                template.render(field, label_data, time_hr, output_path)
+            finally:
+                template.close()
+        return output_path
+
+    def get_template(self, geometry, model_run_str, data, layers="all"):
+        key = (geometry.fingerprint, model_run_str, layers)
+        if self._template is None or self._template.key != key:
+            if self._template is not None:
+                self._template.close()
+            self._template = FigureTemplate(self, geometry, model_run_str, data, layers=layers)
+            self._template.key = key
+        return self._template
+
+    def label_box(self, geometry):
+        return dict(
+            lat_min=self.LAT_MIN,
+            lat_max=self.LAT_MAX,
+            lon_min=self.LON_MIN,
+            lon_max=self.LON_MAX,
+            padding=self.region_config["label_padding"],
+            mask=geometry.region_mask(self.region, self.region_config)
+        )
 
-        print(f"🚀 Starting rendering with {len(wrf_files)} files...")
+    def annotate_labels(self, ax, geometry, label_data):
+        if label_data is None:
+            return []
+        with profile_stage("labels"):
+            return self._annotate_labels(ax, geometry, label_data)
+
+    def _annotate_labels(self, ax, geometry, label_data):
+        return self.grid_labeler.annotate(
+            ax=ax,
+            data=label_data,          # unzoomed
+            lats=geometry.lats,       # unzoomed
+            lons=geometry.lons,       # unzoomed
+            crs_proj=crs.PlateCarree(),
+            **self.label_box(geometry)
+        )
+
+    def label_points(self, geometry, label_data):
+        if label_data is None:
+            return np.empty(0), np.empty(0), []
+        return self.grid_labeler.points(label_data, geometry.lats, geometry.lons, **self.label_box(geometry))
+
+    def get_fast_renderer(self, geometry, model_run_str, data, label_data, time_hr):
+        key = (geometry.fingerprint, model_run_str)
+        if self._fast_renderer is None or self._fast_renderer.key != key:
+            self._fast_renderer = FastRenderer(self, geometry, model_run_str, data, label_data, time_hr)
+            self._fast_renderer.key = key
+        return self._fast_renderer
+
+    def __getstate__(self):
+        # Figures and fonts stay in the process that made them; pool workers build their own
+        state = self.__dict__.copy()
+        state["_template"] = None
+        state["_fast_renderer"] = None
+        return state
+
+    def stream_frames(self, wrf_files, frames):
+        """(filepath, state) of each frame, streaming every file through stream_frame() in order."""
+        frames = set(frames)
         for filepath in wrf_files:
-            self.plot_file(filepath)
-        print(f"✅ Export complete: {len(wrf_files)} plots → {self.output_dir}")
+            state = self.stream_frame(filepath)
+            if filepath in frames:
+                yield filepath, state
+
+    def run_all(self, workers=1):
+        assign_domains([self], find_domains(self.data_dir))
+        wrf_files = self.get_run_index().files
+        self.read_window = None
+        frames = self.prepare_run(wrf_files)
+        self.warm_up(wrf_files[0])
+
+        print(f"🚀 Starting rendering with {len(wrf_files)} files ({max(1, workers)} worker(s))...")
+        if workers > 1 and len(frames) > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+                results = list(_submit_in_order(pool, _render_in_worker, self.stream_frames(wrf_files, frames),
+                                                2 * workers))
+        else:
+            results = []
+            for filepath, state in self.stream_frames(wrf_files, frames):
+                self.receive_frame(filepath, state)
+                results.append(_render_frame(self, filepath))
+
+        print_summary(self.output_dir, results)
+        return results
 
     def get_model_run_time_from_first_file(self):
-        wrf_files = sorted(glob(os.path.join(self.data_dir, "wrfout*_d01_*")))
-        if not wrf_files:
-            return None
         try:
-            first = Dataset(wrf_files[0])
-            time_var = getvar(first, "times").values
-            time_str = str(time_var[0]) if isinstance(time_var, (np.ndarray, list)) else str(time_var)
-            dt = datetime.strptime(time_str.split(".")[0], "%Y-%m-%dT%H:%M:%S")
-            return dt.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Europe/Ljubljana"))
+            return self.get_run_index().model_run_time
         except Exception as e:
             print(f"❌ Could not get model run time: {e}")
             return None
 
+def print_summary(output_dir, results):
+    failures = [(filepath, error) for filepath, _, error in results if error is not None]
+    # Frames skipped by get_frame_data() have neither an output nor an error
+    rendered = sum(1 for _, output, _ in results if output is not None)
+    print(f"✅ Export complete: {rendered} plots → {output_dir}")
+    if failures:
+        print(f"⚠️ {len(failures)} of {len(results)} frames failed:")
+        for filepath, error in failures:
+            print(f"   ❌ {os.path.basename(filepath)}: {error}")
+
+_WORKER = None
+
+def _render_frame(plotter, filepath, wrf_file=None):
+    if _PROFILER is not None:
+        frame = _PROFILER.frame(plotter.get_variable_folder(), plotter.region, filepath)
+    else:
+        frame = nullcontext({})
+    try:
+        with frame as record:
+            try:
+                return filepath, plotter.render_file(filepath, wrf_file), None
+            except Exception as e:
+                record["error"] = str(e)
+                raise
+    except Exception as e:
+        print(f"❌ Failed to process {filepath}: {e}")
+        plt.close('all')
+        return filepath, None, str(e)
+
+def _init_worker(worker):
+    # Each pool process keeps its own copy of the plotter and its per-run state, so frames
+    # only carry their file path and what stream_frame() computed for them.
+    global _WORKER
+    _WORKER = worker
+
+def _render_in_worker(filepath, state=None):
+    _WORKER.receive_frame(filepath, state)
+    return _render_frame(_WORKER, filepath)
+
+def _render_products_in_worker(filepath, products=None, states=None):
+    return _WORKER.render_products(filepath, products, states)
+
+def _submit_in_order(pool, fn, jobs, limit):
+    """Yield fn(*job) for each job in order, with at most limit jobs submitted but not yet collected.
+
+    jobs is consumed lazily, so state streamed with each frame is only held for the
+    frames in flight rather than for the whole run.
+    """
+    pending = deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, *job))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+class MultiProductRenderer:
+    """Renders several products (and regions) per wrfout file from a single open of that file.
+
+    Plotters may render different domains of a nested run (assign_domains); files of all
+    domains go through the same pool in time order, each for the plotters of its domain.
+    """
+
+    def __init__(self, plotters, data_dir, persist_index=False):
+        self.plotters = plotters
+        self.data_dir = data_dir
+        self.persist_index = persist_index
+        self.frames = [set() for _ in plotters]
+
+    def domain_products(self, filepath):
+        """Which plotters render filepath's domain."""
+        domain = file_domain(filepath)
+        return [plotter.run_domain == domain for plotter in self.plotters]
+
+    def stream_frame(self, filepath, wrf_file=None):
+        products = self.domain_products(filepath)
+        if wrf_file is None and any(plotter.streams and wanted for plotter, wanted in zip(self.plotters, products)):
+            wrf_file = WRFFile(filepath).open()
+            try:
+                return self.stream_frame(filepath, wrf_file)
+            finally:
+                wrf_file.close()
+        return [plotter.stream_frame(filepath, wrf_file) if wanted else None
+                for plotter, wanted in zip(self.plotters, products)]
+
+    def render_products(self, filepath, products=None, states=None):
+        """Render filepath for every plotter that has it as a frame (or for those flagged in products).
+
+        states are the plotters' stream_frame() results; without them they are computed
+        here, which is only right when files come in run order (sequential runs).
+        """
+        if products is None:
+            products = [filepath in frames for frames in self.frames]
+        wrf_file = WRFFile(filepath).open()
+        try:
+            if states is None:
+                states = self.stream_frame(filepath, wrf_file)
+            results = []
+            for plotter, wanted, state in zip(self.plotters, products, states):
+                if wanted:
+                    plotter.receive_frame(filepath, state)
+                results.append(_render_frame(plotter, filepath, wrf_file) if wanted else None)
+            return results
+        finally:
+            wrf_file.close()
+
+    def build_indexes(self, first_files, files=None):
+        """Pick each plotter's domain and index the domains in use; files limits them (see run_watch)."""
+        assign_domains(self.plotters, first_files)
+        return {
+            domain: RunIndex.build(self.data_dir, domain, persist=self.persist_index and files is None,
+                                   files=None if files is None else [f for f in files if file_domain(f) == domain])
+            for domain in sorted({plotter.run_domain for plotter in self.plotters})
+        }
+
+    def start_run(self, run_indexes):
+        for plotter in self.plotters:
+            plotter.run_index = run_indexes[plotter.run_domain]
+        self.frames = [set(plotter.prepare_run(plotter.run_index.files)) for plotter in self.plotters]
+        Acc_Precip.share_accumulator(self.plotters)
+        for plotter in self.plotters:
+            plotter.warm_up(plotter.run_index.files[0])
+        for domain, run_index in run_indexes.items():
+            wrf_file = WRFFile(run_index.files[0]).open()
+            try:
+                self.share_read_window(run_index, wrf_file,
+                                       [plotter for plotter in self.plotters if plotter.run_domain == domain])
+            finally:
+                wrf_file.close()
+
+    @staticmethod
+    def share_read_window(run_index, wrf_file, plotters):
+        """Have the plotters of one domain read the window enclosing all of theirs from the shared file.
+
+        Regions (and label strides) crop different windows; read one by one, each would
+        re-read and re-diagnose the file. With the enclosing window every field is decoded
+        once per file and each plotter slices its own grid from it.
+        """
+        windows = {plotter.get_geometry(wrf_file).window for plotter in plotters}
+        read_window = None
+        if len(windows) > 1:
+            ny, nx = run_index.grid_shape
+            bounds = [window or (0, ny, 0, nx) for window in windows]
+            read_window = (min(b[0] for b in bounds), max(b[1] for b in bounds),
+                           min(b[2] for b in bounds), max(b[3] for b in bounds))
+        for plotter in plotters:
+            plotter.read_window = read_window
+
+    def describe(self):
+        if len({plotter.region for plotter in self.plotters}) == 1:
+            return ", ".join(plotter.get_variable_folder() for plotter in self.plotters)
+        return ", ".join(f"{plotter.region}/{plotter.get_variable_folder()}" for plotter in self.plotters)
+
+    def summarise(self, per_file):
+        results = []
+        for i, plotter in enumerate(self.plotters):
+            product_results = [row[i] for row in per_file if row[i] is not None]
+            print_summary(plotter.output_dir, product_results)
+            results.append(product_results)
+        return results
+
+    def run_all(self, workers=1):
+        run_indexes = self.build_indexes(find_domains(self.data_dir))
+        self.start_run(run_indexes)
+        # Domains interleaved by valid time; each keeps its own file order for stream_frame()
+        wrf_files = sorted((filepath for run_index in run_indexes.values() for filepath in run_index.files),
+                           key=lambda filepath: (run_indexes[file_domain(filepath)].valid_time(filepath), filepath))
+
+        names = self.describe()
+        print(f"🚀 Starting rendering of {names} with {len(wrf_files)} files ({max(1, workers)} worker(s))...")
+        if workers > 1 and len(wrf_files) > 1:
+            jobs = ((filepath, None, self.stream_frame(filepath)) for filepath in wrf_files)
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+                per_file = list(_submit_in_order(pool, _render_products_in_worker, jobs, 2 * workers))
+        else:
+            per_file = [self.render_products(filepath) for filepath in wrf_files]
+
+        return self.summarise(per_file)
+
+    def run_watch(self, watcher, workers=1):
+        """Render each file as soon as the watcher reports it complete, until the run ends.
+
+        Per-run state (domains, prepare_run) is set up once the first file of every domain
+        on disk is complete; every later file is rendered for all products of its domain,
+        and streamed through stream_frame() as it arrives.
+        """
+        files = iter(watcher)
+        started = []
+        first_files = {}
+        for filepath in files:
+            started.append(filepath)
+            first_files.setdefault(file_domain(filepath), filepath)
+            # Nests write their first file together with the parent's
+            if set(first_files) >= set(find_domains(self.data_dir)):
+                break
+        if not started:
+            print("⚠️ Run ended without any complete wrfout file")
+            return [[] for _ in self.plotters]
+
+        run_indexes = self.build_indexes(first_files, files=first_files.values())
+        self.start_run(run_indexes)
+        watcher.domains = set(run_indexes)
+        firsts = set(first_files.values())
+
+        def arrivals():
+            for filepath in itertools.chain(started, files):
+                domain = file_domain(filepath)
+                if domain not in run_indexes:
+                    continue
+                if filepath in firsts:
+                    yield filepath, None
+                else:
+                    run_indexes[domain].add(filepath)
+                    yield filepath, self.domain_products(filepath)
+
+        names = self.describe()
+        print(f"👀 Watching {self.data_dir} for {names} ({max(1, workers)} worker(s))...")
+        if workers > 1:
+            # Workers get the state set up above; they read valid times of later files themselves
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as pool:
+                futures = [pool.submit(_render_products_in_worker, filepath, products, self.stream_frame(filepath))
+                           for filepath, products in arrivals()]
+                per_file = [future.result() for future in futures]
+        else:
+            per_file = [self.render_products(filepath, products) for filepath, products in arrivals()]
+
+        if self.persist_index:
+            for run_index in run_indexes.values():
+                run_index.save()
+        return self.summarise(per_file)
+
 class Max_Dbz(WRFPlotter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -367,8 +2168,8 @@ class Max_Dbz(WRFPlotter):
         ]
         self.light_gray = "#626262"
 
-    def create_source(self, filepath):
-        return NetCDFWRFSource(filepath, self.variable_name)
+    def create_source(self, filepath, wrf_file=None):
+        return NetCDFWRFSource(filepath, self.variable_name, wrf_file)
 
     def configure_colormap(self):
         bin_edges = [low for (low, _) in self.reflectivity_bins] + [self.reflectivity_bins[-1][1]]
@@ -394,8 +2195,8 @@ class Temperature(WRFPlotter):
         self.temperature_ticks = list(range(-20, 42, 2))
         self.temperature_levels = list(range(-20, 42, 2))
 
-    def create_source(self, filepath):
-        return TemperatureWRFSource(filepath, self.variable_name)
+    def create_source(self, filepath, wrf_file=None):
+        return TemperatureWRFSource(filepath, self.variable_name, wrf_file)
 
     def configure_colormap(self):
         cmap = ListedColormap(self.temperature_colors)
@@ -408,11 +2209,62 @@ class Temperature(WRFPlotter):
     def friendly_name(self):
         return "temperatura"
     
+# Accumulation windows in hours with a product of their own (--type precip_<hours>h)
+PRECIP_WINDOWS = (1, 3, 6, 12, 24)
+
+class PrecipAccumulator:
+    """Precipitation over several windows from one in-order pass over a run.
+
+    add() takes each file's total precipitation (mm since model start) in valid-time
+    order and returns the accumulation since the first file (key None) and over each
+    window of hours ending at that file (None until the run covers the window). Only the
+    totals inside the longest window are kept, so memory is bounded by that window and
+    not by the length of the run. Negative differences (bucket resets, restarts) are
+    masked as NaN, as in acc_rain_1_0_2_detailed_args.py.
+    """
+
+    def __init__(self, windows=()):
+        self.windows = sorted(set(window for window in windows if window))
+        self.first = None
+        self.history = deque()
+        self._last = (None, None)
+
+    @staticmethod
+    def difference(total, earlier):
+        accumulation = total - earlier
+        accumulation[accumulation < 0] = np.nan
+        return accumulation
+
+    def add(self, key, valid_time, read_total):
+        """Accumulations ending at valid_time; read_total() is called once per key (file)."""
+        if self._last[0] == key:
+            return self._last[1]
+        total = np.asarray(read_total(), dtype=np.float32)
+        if self.first is None:
+            self.first = total
+        accumulations = {None: self.difference(total, self.first)}
+        if self.windows:
+            horizon = valid_time - timedelta(hours=self.windows[-1])
+            while self.history and self.history[0][0] < horizon:
+                self.history.popleft()
+            earlier = dict(self.history)
+            for window in self.windows:
+                start = earlier.get(valid_time - timedelta(hours=window))
+                accumulations[window] = None if start is None else self.difference(total, start)
+            self.history.append((valid_time, total))
+        self._last = (key, accumulations)
+        return accumulations
+
 class Acc_Precip(WRFPlotter):
-    def __init__(self, *args, **kwargs):
+    feature_color = 'black'
+    streams = True
+
+    def __init__(self, *args, window=None, **kwargs):
+        # Hours accumulated up to each frame; None accumulates since the first file
+        self.window = window
         super().__init__(*args, **kwargs)
-        self.variable_name = "RAINNC"
-        self.initial_data = None
+        self.accumulator = None
+        self.frame_fields = {}
         self.precipitation_colors = [
             "#ffffff", "#e3f0ff", "#cce1ff", "#8fbdff", "#529bdd", "#2876b5", "#208e91",
             "#04aa8a", "#2cc469", "#98d344", "#d7e205", "#ffea92", "#ffd03b", "#ff9124",
@@ -423,8 +2275,8 @@ class Acc_Precip(WRFPlotter):
         self.precip_levels = [0.1, 0.5, 1, 2, 5, 10, 15, 20, 30, 40, 50,
                       60, 80, 100, 120, 140, 160, 180, 200, 250, 300]
 
-    def create_source(self, filepath):
-        return NetCDFWRFSource(filepath, self.variable_name)
+    def create_source(self, filepath, wrf_file=None):
+        return PrecipitationWRFSource(filepath, wrf_file)
 
     def configure_colormap(self):
         cmap = ListedColormap(self.precipitation_colors)
@@ -436,139 +2288,363 @@ class Acc_Precip(WRFPlotter):
         return "padavine [mm]"
     
     def friendly_name(self):
-        return "padavine"
+        if self.window is None:
+            return "padavine"
+        return f"padavine v {self.window} h"
 
     def get_variable_folder(self):
-        return "accumulated_precipitation"
-
-    def plot_file(self, filepath):
+        if self.window is None:
+            return "accumulated_precipitation"
+        return f"accumulated_precipitation_{self.window}h"
+
+    @staticmethod
+    def share_accumulator(plotters):
+        """Give the precipitation products of each region one accumulator, so each file is read once."""
+        by_region = defaultdict(list)
+        for plotter in plotters:
+            if isinstance(plotter, Acc_Precip):
+                by_region[plotter.region].append(plotter)
+        for precip in by_region.values():
+            if len(precip) > 1:
+                accumulator = PrecipAccumulator([plotter.window for plotter in precip])
+                for plotter in precip:
+                    plotter.accumulator = accumulator
+
+    def prepare_run(self, wrf_files):
+        # Totals are streamed through the accumulator in file order (stream_frame) in the
+        # main process; pool workers only get the accumulated field of their frame.
+        self.accumulator = PrecipAccumulator([self.window])
+        self.frame_fields = {}
+        frames = wrf_files[1:]  # skip first frame (zero accumulation)
+        if self.window is None:
+            return frames
+        run_index = self.get_run_index()
+        start = run_index.valid_time(wrf_files[0]) + timedelta(hours=self.window)
+        return [filepath for filepath in frames if run_index.valid_time(filepath) >= start]
+
+    def read_total(self, filepath, wrf_file=None):
+        source, _ = self.open_source(filepath, wrf_file)
         try:
-            source = self.create_source(filepath)
-            source.open()
-            data = source.get_data()
-
-            if self.initial_data is None:
-                self.initial_data = data
-                return  # skip first frame (zero accumulation)
-
-            data = data - self.initial_data
-            lats, lons = source.get_latlon()
-            proj = source.get_projection()
-
-            model_run_local = self.get_model_run_time_from_first_file()
-            model_run_str = model_run_local.strftime("%-d. %-m. %Y ob %H:%M")
-            dt_local = source.get_valid_time()
-            time_str = dt_local.strftime("%Y%m%d_%H%M")
-            time_hr = dt_local.strftime("%-d. %-m. %Y ob %H:%M")
-
-            factor = 4.0
-            data_zoomed = zoom(to_np(data), factor, order=1)
-            lat_zoomed = zoom(to_np(lats), factor, order=1)
-            lon_zoomed = zoom(to_np(lons), factor, order=1)
-
-            cmap, norm, ticks = self.configure_colormap()
-
-            fig, ax = plt.subplots(figsize=(12, 12), subplot_kw={'projection': proj})
-            fig.set_facecolor('#333333')
-            ax.set_extent([self.LON_MIN, self.LON_MAX, self.LAT_MIN, self.LAT_MAX], crs=crs.PlateCarree())
-
-            ax.coastlines(resolution='10m', linewidth=0.4, color='black')
-            ax.add_feature(cfeature.BORDERS.with_scale('10m'), linewidth=1.0, edgecolor='black')
-
-            ax.pcolormesh(lon_zoomed, lat_zoomed, data_zoomed, cmap=cmap,
-                          norm=norm, transform=crs.PlateCarree(), antialiased=False)
-
-            # Only annotate where value > 0.1 mm
-            mask = to_np(data) > 0.9
-            if np.any(mask):
-                filtered_data = np.where(mask, to_np(data), np.nan)
-                self.grid_labeler.annotate(
-                    ax=ax,
-                    data=filtered_data,  # Only label significant values
-                    lats=to_np(lats),
-                    lons=to_np(lons),
-                    lat_min=self.LAT_MIN,
-                    lat_max=self.LAT_MAX,
-                    lon_min=self.LON_MIN,
-                    lon_max=self.LON_MAX,
-                    crs_proj=crs.PlateCarree(),
-                    padding=self.region_config["label_padding"],
-                    threshold=self.region_config["edge_threshold"]
-                )
-
-
-            sm = ScalarMappable(norm=norm, cmap=cmap)
-            sm.set_array([])
-            cbar_ax = fig.add_axes(self.cbar_position)
-            cbar = plt.colorbar(sm, cax=cbar_ax, orientation='horizontal', ticks=ticks)
-            cbar.set_label(self.colorbar_label(), color='white', labelpad=8, weight='bold')
-            def format_tick(x):
-                if x < 1:
-                    return f"{x:.1f}"
-                else:
-                    return f"{int(x)}"
-
-            cbar.ax.set_xticklabels([format_tick(x) for x in ticks], color='white')
+            return to_np(source.get_data()).astype(np.float32)
+        finally:
+            source.close()
 
-            cbar.outline.set_edgecolor('none')
+    def stream_frame(self, filepath, wrf_file=None):
+        valid_time = self.get_run_index().valid_time(filepath)
+        accumulations = self.accumulator.add(filepath, valid_time, lambda: self.read_total(filepath, wrf_file))
+        return accumulations[self.window]
 
-            logo_resized = self.create_logo()
-            if logo_resized is not None:
-                fig.figimage(logo_resized, xo=self.logo_position[0], yo=self.logo_position[1], zorder=20)
+    def receive_frame(self, filepath, field):
+        self.frame_fields[filepath] = field
 
-            ax.text(0.5, 1.01, time_hr, transform=ax.transAxes, fontsize=13, color='white', weight='bold', ha='center')
-            ax.text(1.0, 1.01, self.friendly_name(), transform=ax.transAxes, fontsize=13,
-                    color='white', weight='bold', ha='right')
-            ax.text(0.01, -0.12, f"Zagon modela: {model_run_str}", transform=ax.transAxes,
-                    fontsize=10, ha='left', va='top', color='white', weight='bold')
-            ax.text(0.99, -0.12, "Vir podatkov: TempoQuest - ICON-D2", transform=ax.transAxes,
-                    fontsize=10, ha='right', va='top', color='white', weight='bold')
+    def get_frame_data(self, source):
+        # None until the run covers the window, which skips the frame
+        return self.frame_fields.pop(source.filepath, None)
 
-            output_path = os.path.join(self.output_dir, f"{self.get_variable_folder()}_{time_str}.png")
-            plt.savefig(output_path, bbox_inches='tight', dpi=160, pad_inches=0.15)
-            plt.close()
-            source.close()
+    def get_label_data(self, data):
+        # Only annotate where value > 0.1 mm
+        mask = to_np(data) > 0.9
+        if not np.any(mask):
+            return None
+        return np.where(mask, to_np(data), np.nan)
 
-        except Exception as e:
-            print(f"❌ Failed to process {filepath}: {e}")
+    def format_tick(self, x):
+        if x < 1:
+            return f"{x:.1f}"
+        else:
+            return f"{int(x)}"
 
 import argparse
+import socket
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+
+PLOT_TYPES = {
+    "mdbz": Max_Dbz,
+    "temp": Temperature,
+    "precip": Acc_Precip,
+}
 
-if __name__ == "__main__":
+# Windowed precipitation, e.g. "precip_3h"; not part of --type all
+PRECIP_WINDOW_TYPES = {f"precip_{window}h": window for window in PRECIP_WINDOWS}
+
+DEFAULT_GEOMETRY_CACHE = os.environ.get(
+    "WRF_GEOMETRY_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "wrf_plots", "geometry")
+)
+
+DEFAULT_FEATURE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feature_cache")
+
+def build_plotter(plot_type, args, geometry_cache=None, feature_cache=None, region=None):
+    plotter_cls = PLOT_TYPES.get(plot_type)
+    extra = {}
+    if plot_type in PRECIP_WINDOW_TYPES:
+        plotter_cls = Acc_Precip
+        extra["window"] = PRECIP_WINDOW_TYPES[plot_type]
+    if plotter_cls is None:
+        raise ValueError(f"Unsupported plot type: {plot_type}")
+    return plotter_cls(
+        data_dir=args.data_dir,
+        logo_path=args.logo_path,
+        region=region or args.region,
+        # Reflectivity maps are not labelled
+        stride=None if plot_type == "mdbz" else args.stride,
+        weather_model=args.weather_model,
+        persist_index=args.persist_index,
+        geometry_cache=geometry_cache,
+        render_mode=args.render,
+        feature_cache=feature_cache,
+        label_spacing=args.label_spacing,
+        resample=args.resample,
+        backend=args.backend,
+        crop_margin=args.crop_margin,
+        image_writer=ImageWriter(args.image_format, args.compress_level),
+        domain=None if args.domain == "auto" else args.domain,
+        **extra
+    )
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Generate WRF plots (reflectivity, temperature, precipitation)")
-    parser.add_argument("--data_dir", required=True, help="Path to WRF output files (e.g., wrfout_d01_*)")
+    parser.add_argument("--data_dir", help="Path to WRF output files (e.g., wrfout_d01_*, wrfout_d02_*)")
     parser.add_argument("--logo_path", default="logo_512_39.webp", help="Path to logo image (optional)")
     parser.add_argument("--region", default="slovenia", help="Region key (e.g., 'slovenia' or 'slovenia_istria')")
+    parser.add_argument("--regions", default=None,
+                        help="Comma-separated region keys (or 'all') rendered from one read of each file; "
+                             "overrides --region")
+    parser.add_argument("--domain", default="auto",
+                        help="WRF domain to render (e.g., d01 or d02); 'auto' uses the finest domain whose grid "
+                             "covers each region and the parent for the others")
     parser.add_argument("--stride", type=int, default=6, help="Grid label stride")
-    parser.add_argument("--type", choices=["mdbz", "temp", "precip"], default="mdbz", help="Type of plot")
-    parser.add_argument("--weather_model", required=True, help="Weather model name (e.g., ICON-D2, WRF, ARPEGE)")
+    parser.add_argument("--type", choices=list(PLOT_TYPES) + list(PRECIP_WINDOW_TYPES) + ["all"], default="mdbz",
+                        help="Type of plot ('all' renders mdbz, temp and precip from one read of each file; "
+                             "precip_<hours>h is precipitation over the last hours)")
+    parser.add_argument("--types", default=None,
+                        help="Comma-separated plot types rendered from one read of each file (e.g., mdbz,temp,precip; "
+                             "precip,precip_1h,precip_24h accumulates every window in one pass)")
+    parser.add_argument("--label_spacing", type=float, default=None,
+                        help="Minimum distance between grid labels in degrees (declutters dense label grids)")
+    parser.add_argument("--weather_model", help="Weather model name (e.g., ICON-D2, WRF, ARPEGE)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes rendering frames in parallel")
+    parser.add_argument("--persist_index", action="store_true",
+                        help=f"Keep the run index as a JSON sidecar ({RunIndex.SIDECAR_NAME}) in data_dir for reruns")
+    parser.add_argument("--geometry_cache", default=DEFAULT_GEOMETRY_CACHE,
+                        help="Directory for cached grid geometry (.npy); empty string keeps it in memory only")
+
+    parser.add_argument("--render", choices=["figure", "template", "overlay"], default="figure",
+                        help="'template' draws basemap, colorbar and labels once and only swaps the data per frame; "
+                             "'overlay' also rasterises the static decorations once and composites them per frame")
+
+    parser.add_argument("--resample", choices=["zoom", "pixel"], default="zoom",
+                        help="'zoom': 4x scipy zoom drawn with pcolormesh; "
+                             "'pixel': cached bilinear grid-to-pixel mapping drawn with imshow")
+    parser.add_argument("--crop_margin", type=float, default=None,
+                        help="Read only the grid window covering the region plus this margin in degrees "
+                             "(default: full domain)")
+    parser.add_argument("--backend", choices=["matplotlib", "fast"], default="matplotlib",
+                        help="'fast': draw frames from NumPy onto layers rasterised once by matplotlib "
+                             "(always uses the pixel resampling; --render is ignored)")
+    parser.add_argument("--image_format", choices=list(ImageWriter.EXTENSIONS), default="png",
+                        help="'png': RGBA PNG at a tight bbox per frame; 'png8': 8-bit paletted PNG and "
+                             "'webp': lossless WebP, both at a layout measured once per run")
+    parser.add_argument("--compress_level", type=int, default=None,
+                        help="PNG zlib level 0-9 or WebP effort 0-6 (default: Pillow's)")
+    parser.add_argument("--feature_cache", default=DEFAULT_FEATURE_CACHE,
+                        help="Directory with region-clipped coastline/border geometries; empty string uses cartopy's shapefiles")
+    parser.add_argument("--watch", action="store_true",
+                        help="Render wrfout files as the model writes them and exit when the run has finished")
+    parser.add_argument("--poll_interval", type=float, default=30.0, help="Seconds between directory scans in --watch")
+    parser.add_argument("--done_file", default=None,
+                        help="In --watch, the run counts as finished once this file exists "
+                             "(WRF's success line in rsl.out.0000 also ends the watch)")
+    parser.add_argument("--idle_timeout", type=float, default=None,
+                        help="In --watch, stop if no file completes for this many seconds")
+    parser.add_argument("--build_feature_cache", action="store_true",
+                        help="Clip Natural Earth coastlines/borders for every region into --feature_cache and exit")
+
+    parser.add_argument("--profile_dir", default=None,
+                        help="Write per-frame stage timings and peak RSS (frames.csv, frames.json) here "
+                             "and print a summary at the end")
+    parser.add_argument("--profile", action="store_true",
+                        help="Also write cProfile dumps (.prof, for pstats/snakeviz) of the slowest frames "
+                             "(default --profile_dir: ./profile)")
+    parser.add_argument("--profile_keep", type=int, default=3, help="Number of cProfile dumps kept by --profile")
+    parser.add_argument("--serve", metavar="SOCKET", default=None,
+                        help="Run as a long-lived render service on this Unix socket (see render_client.py); "
+                             "requests take the other options, --geometry_cache/--feature_cache come from here")
+    return parser
+
+def parse_plot_types(args):
+    if args.types:
+        return [t.strip() for t in args.types.split(",") if t.strip()]
+    if args.type == "all":
+        return list(PLOT_TYPES)
+    return [args.type]
+
+def parse_regions(args):
+    if not args.regions:
+        return [args.region]
+    if args.regions == "all":
+        return list(REGIONS)
+    return [r.strip() for r in args.regions.split(",") if r.strip()]
+
+def run_request(args, make_plotter):
+    """Render what the parsed command line asks for; make_plotter(plot_type, region) supplies the plotters."""
+    global _PROFILER
+    if not (args.profile or args.profile_dir):
+        return _run_request(args, make_plotter)
+    _PROFILER = FrameProfiler(args.profile_dir or "profile", cprofile=args.profile, keep=args.profile_keep)
+    _PROFILER.start()
+    try:
+        return _run_request(args, make_plotter)
+    finally:
+        _PROFILER.report()
+        _PROFILER = None
+
+def _run_request(args, make_plotter):
+    plotters = [make_plotter(t, region) for region in parse_regions(args) for t in parse_plot_types(args)]
+    if args.watch:
+        renderer = MultiProductRenderer(plotters, args.data_dir, persist_index=args.persist_index)
+        watcher = RunWatcher(args.data_dir, poll_interval=args.poll_interval, done_file=args.done_file,
+                             idle_timeout=args.idle_timeout)
+        return renderer.run_watch(watcher, workers=args.workers)
+
+    if len(plotters) == 1:
+        plotter = plotters[0]
+    else:
+        plotter = MultiProductRenderer(plotters, args.data_dir, persist_index=args.persist_index)
+    return plotter.run_all(workers=args.workers)
+
+class _SocketLog(io.TextIOBase):
+    """Text stream sending each complete line to the client as {"log": line}."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            send_message(self.conn, {"log": line})
+        return len(text)
+
+def send_message(conn, message):
+    try:
+        conn.sendall((json.dumps(message) + "\n").encode())
+    except OSError:
+        pass  # client went away; keep rendering so the outputs are still complete
+
+class RenderService:
+    """Long-lived renderer answering render requests on a Unix socket.
+
+    Started once per worker (render_service.sh), it pays the imports, font loading and
+    Natural Earth reads once; geometry and feature caches stay in memory between jobs
+    and plotters are reused for requests with the same options. Requests are handled one
+    at a time. The client (render_client.py) sends one JSON line {"argv": [...], "cwd": dir}
+    with this script's command line options; the service answers with {"log": line}
+    lines while rendering and a final {"status": "ok" | "error", "frames", "failed", "error"}.
+    """
+
+    # Options build_plotter() reads; requests differing only in others share plotters
+    PLOTTER_OPTIONS = ("data_dir", "logo_path", "region", "domain", "stride", "weather_model", "persist_index", "render",
+                       "label_spacing", "resample", "backend", "crop_margin", "image_format", "compress_level")
+
+    def __init__(self, socket_path, parser, geometry_cache, feature_cache):
+        self.socket_path = socket_path
+        self.parser = parser
+        self.geometry_cache = geometry_cache
+        self.feature_cache = feature_cache
+        self._plotters = {}
+
+    def warm_up(self):
+        """Load fonts and cartopy's projection machinery before the first request."""
+        started = time.monotonic()
+        fig = plt.figure(figsize=(2, 2))
+        ax = fig.add_subplot(1, 1, 1, projection=crs.LambertConformal())
+        ax.set_extent([13.3, 16.45, 45.18, 46.98], crs=crs.PlateCarree())
+        ax.set_title("Čas 1. 1. 2025 ob 12:00 °C dBZ")
+        fig.canvas.draw()
+        plt.close(fig)
+        print(f"🔥 Render service warmed up in {time.monotonic() - started:.1f} s")
+
+    def get_plotter(self, plot_type, region, args):
+        key = (plot_type, region, os.getcwd()) + tuple(getattr(args, name) for name in self.PLOTTER_OPTIONS)
+        plotter = self._plotters.get(key)
+        if plotter is None:
+            plotter = build_plotter(plot_type, args, self.geometry_cache, self.feature_cache, region)
+            self._plotters[key] = plotter
+        # The files in data_dir change between jobs
+        plotter.run_index = None
+        return plotter
+
+    def handle(self, conn):
+        with conn, conn.makefile("r") as reader:
+            try:
+                request = json.loads(reader.readline())
+            except ValueError as e:
+                send_message(conn, {"status": "error", "error": f"Bad request: {e}"})
+                return
+            if request.get("ping"):
+                send_message(conn, {"status": "ok"})
+                return
+
+            reply = {"status": "ok", "frames": 0, "failed": 0}
+            stream = _SocketLog(conn)
+            started = time.monotonic()
+            with redirect_stdout(stream), redirect_stderr(stream):
+                try:
+                    os.chdir(request.get("cwd") or "/")
+                    args = self.parser.parse_args(request.get("argv", []))
+                    if args.serve or args.build_feature_cache or not args.data_dir or not args.weather_model:
+                        self.parser.error("requests need --data_dir and --weather_model, "
+                                          "and cannot use --serve or --build_feature_cache")
+                    results = run_request(args, lambda plot_type, region: self.get_plotter(plot_type, region, args))
+                    per_frame = results if results and isinstance(results[0], tuple) else sum(results, [])
+                    reply["frames"] = len(per_frame)
+                    reply["failed"] = sum(1 for _, _, error in per_frame if error is not None)
+                except SystemExit as e:
+                    reply = {"status": "error", "error": f"Invalid arguments (exit {e.code})"}
+                except Exception as e:
+                    traceback.print_exc()
+                    reply = {"status": "error", "error": str(e)}
+                finally:
+                    plt.close('all')
+            print(f"📨 Request {request.get('argv')} → {reply['status']} in {time.monotonic() - started:.1f} s")
+            send_message(conn, reply)
+
+    def serve(self):
+        self.warm_up()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen()
+        print(f"🛎️ Render service listening on {self.socket_path}")
+        try:
+            while True:
+                conn, _ = server.accept()
+                self.handle(conn)
+        finally:
+            server.close()
+            os.remove(self.socket_path)
 
+if __name__ == "__main__":
+    parser = build_parser()
     args = parser.parse_args()
 
-    if args.type == "mdbz":
-        plotter = Max_Dbz(
-            data_dir=args.data_dir,
-            logo_path=args.logo_path,
-            region=args.region,
-            weather_model=args.weather_model
-        )
-    elif args.type == "temp":
-        plotter = Temperature(
-            data_dir=args.data_dir,
-            logo_path=args.logo_path,
-            region=args.region,
-            stride=args.stride,
-            weather_model=args.weather_model
-        )
-    elif args.type == "precip":
-        plotter = Acc_Precip(
-            data_dir=args.data_dir,
-            logo_path=args.logo_path,
-            region=args.region,
-            stride=args.stride,
-            weather_model=args.weather_model
-        )
-    else:
-        raise ValueError("Unsupported plot type")
+    feature_cache = FeatureCache(args.feature_cache) if args.feature_cache else None
+    if args.build_feature_cache:
+        if feature_cache is None:
+            parser.error("--build_feature_cache needs --feature_cache")
+        feature_cache.build_all(REGIONS)
+        raise SystemExit(0)
+
+    geometry_cache = GeometryCache(args.geometry_cache or None)
+    if args.serve:
+        RenderService(args.serve, parser, geometry_cache, feature_cache).serve()
+        raise SystemExit(0)
+
+    if not args.data_dir or not args.weather_model:
+        parser.error("--data_dir and --weather_model are required")
 
-    plotter.run_all()
+    run_request(args, lambda plot_type, region: build_plotter(plot_type, args, geometry_cache, feature_cache, region))
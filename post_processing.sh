@@ -2,5 +2,12 @@
 
 set -e  # Exit on error
 
+# With render_during_run (handler.py sets RENDER_DURING_RUN=1 for run.sh) the images were
+# already rendered while the model ran
+if [ "${RENDER_DURING_RUN:-0}" = "1" ]; then
+    echo "[INFO] Images rendered during the run, skipping generate_images.sh"
+    exit 0
+fi
+
 # Run run_setup_wrf.sh
 ./generate_images.sh
@@ -0,0 +1,65 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+
+DEFAULT_SOCKET = os.environ.get("RENDER_SOCKET", "/tmp/wrf_render.sock")
+
+# Exit status when no render service answers, so callers can fall back to a direct run
+EXIT_UNAVAILABLE = 3
+
+
+def connect(socket_path, wait=0.0):
+    """Connect to the render service, retrying for up to wait seconds while it starts."""
+    deadline = time.monotonic() + wait
+    while True:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(socket_path)
+            return conn
+        except OSError:
+            conn.close()
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.5)
+
+
+def submit(conn, request):
+    """Send one request, print the service's log lines as they arrive; returns the final reply."""
+    conn.sendall((json.dumps(request) + "\n").encode())
+    with conn.makefile("r") as reader:
+        for line in reader:
+            message = json.loads(line)
+            if "log" in message:
+                print(message["log"], flush=True)
+            else:
+                return message
+    return {"status": "error", "error": "Render service closed the connection"}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Submit a render job to the render service (max_dbz_..._args.py --serve)",
+        usage="%(prog)s [--socket PATH] [--wait SECONDS] [--ping] -- <max_dbz_..._args.py options>")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket of the service (env RENDER_SOCKET)")
+    parser.add_argument("--wait", type=float, default=0.0, help="Seconds to wait for the service to come up")
+    parser.add_argument("--ping", action="store_true", help="Only check that the service answers")
+    parser.add_argument("render_args", nargs=argparse.REMAINDER, help="Options for the render script")
+    args = parser.parse_args()
+    render_args = args.render_args[1:] if args.render_args[:1] == ["--"] else args.render_args
+
+    conn = connect(args.socket, args.wait)
+    if conn is None:
+        print(f"[WARN] No render service on {args.socket}", file=sys.stderr)
+        sys.exit(EXIT_UNAVAILABLE)
+    with conn:
+        request = {"ping": True} if args.ping else {"argv": render_args, "cwd": os.getcwd()}
+        reply = submit(conn, request)
+
+    if reply.get("status") != "ok":
+        print(f"❌ Render service: {reply.get('error')}", file=sys.stderr)
+        sys.exit(1)
+    if not args.ping:
+        print(f"✅ Render service: {reply['frames'] - reply['failed']} of {reply['frames']} frames rendered")
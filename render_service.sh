@@ -0,0 +1,11 @@
+#!/bin/bash
+
+# Long-lived render service (started once per worker by handler.py); generate_images.sh
+# submits its job to it through render_client.py when RENDER_SOCKET is set
+
+set -e
+
+source "$HOME/miniconda3/etc/profile.d/conda.sh"
+conda activate wrf_icond2
+
+exec python max_dbz_1_0_2_detailed_profi_slo_plus_meteoinfo_OOP_flexible_dbz_t2_args.py --serve "${RENDER_SOCKET:-/tmp/wrf_render.sock}"
@@ -34,6 +34,10 @@ upload_file() {
     --user "$FTP_USER:$FTP_PASS" \
     "ftp://$FTP_HOST$remote_dir/$dst"
   echo "[SUCCESS] Uploaded $dst"
+  # handler.py sums the sizes of the listed files for its metrics
+  if [[ -n "${UPLOAD_MANIFEST:-}" ]]; then
+    echo "$src" >> "$UPLOAD_MANIFEST"
+  fi
 }
 
 # Upload log files (same list for both domains)
@@ -42,6 +46,7 @@ FILES_TO_UPLOAD=(
   "rsl.error.0000"
   "fort.88"
   "namelist.input"
+  "job_metrics.json"
 )
 
 # Toggles